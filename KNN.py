@@ -1,57 +1,337 @@
 # bibliothèques
+import os
+import threading
+from collections import OrderedDict
+
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import MinMaxScaler
 
-# Chargement des données
-urlt = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-df_movies = pd.read_csv(urlt, sep='\t')
-
-# Nettoyage des genres et ajout de la colonne budget (avec des valeurs par défaut)
-df_movies['genres'] = df_movies['genres'].fillna('Sans catégorie')
-df_movies['genres'] = df_movies['genres'].apply(lambda x: x.replace("'","").replace("[","").replace("]","").split(","))
-df_movies['genres'] = df_movies['genres'].apply(lambda x: list(filter(None, [ele.strip() for ele in x])))
-df_movies['budget'] = df_movies['budget'].fillna(df_movies['budget'].mean())  # on remplit les valeurs manquantes avec la moyenne
+import chargement
+import ingestion
+import knn_filtres
+import knn_compression  # enregistre le backend "compresse" dans knn_index.BACKENDS
+import knn_index
+import knn_shards  # enregistre le backend "shards" dans knn_index.BACKENDS
+from knn_features import MatriceFeatures
+from listes import analyser_listes
 
-# Utilisation de get_dummies pour le one-hot encoding des genres
-genres_dummies = pd.get_dummies(df_movies['genres'].explode()).groupby(level=0).sum()
-df_movies = pd.concat([df_movies, genres_dummies], axis=1)
+# Version du format de l'artefact du modèle (à incrémenter si la construction des features change)
+VERSION_MODELE = 3
 
-# Préparation des features
 numeric_features = ['rate', 'year', 'runtimeMinutes', 'budget']
-genre_columns = genres_dummies.columns.tolist()
-feature_columns = numeric_features + genre_columns
-
-# Préparation du dataset pour le modèle
-X = df_movies[feature_columns].copy()
-X = X.fillna(0)
-
-# Normalisation des features numériques
-scaler = MinMaxScaler()
-X[numeric_features] = scaler.fit_transform(X[numeric_features])
-
-# Modèle KNN
-model = NearestNeighbors(n_neighbors=5, metric='euclidean')
-model.fit(X)
-
-def get_movie_recommendations(rate, year, runtime, budget, selected_genre, df=df_movies, model=model, scaler=scaler):
-    input_features = np.zeros(len(feature_columns))
-    
-    # Normalisation des valeurs numériques
-    numeric_array = np.array([[rate, year, runtime, budget]])
-    normalized_values = scaler.transform(numeric_array)
-    
-    # Attribution des valeurs normalisées
-    for i, feature in enumerate(numeric_features):
-        input_features[feature_columns.index(feature)] = normalized_values[0][i]
-    
-    # Attribution du genre sélectionné
-    if selected_genre in genre_columns:
-        genre_idx = feature_columns.index(selected_genre)
-        input_features[genre_idx] = 1
-    
+
+# Index de recherche utilisé par défaut ("exact" ou "ivf", voir knn_index.BACKENDS)
+INDEX_PAR_DEFAUT = os.environ.get("KNN_INDEX", "exact")
+
+# Cache des recommandations : les entrées sont arrondies à ces pas avant la recherche,
+# pour que les requêtes presque identiques (curseurs de l'interface) partagent le même résultat
+TAILLE_CACHE_REQUETES = 4096
+PAS_QUANTIFICATION = {'rate': 0.1, 'year': 1, 'runtime': 1, 'budget': 100_000}
+
+
+# Préparation des films
+def preparer_films():
+    # Chargement des données
+    df_movies = ingestion.charger_snapshot("tconst")
+    genres = _nettoyer(df_movies, df_movies['budget'].mean())
+    return df_movies, genres
+
+
+def _nettoyer(df_movies, budget_moyen):
+    # Nettoyage des genres et ajout de la colonne budget (avec des valeurs par défaut)
+    df_movies['genres'] = df_movies['genres'].fillna('Sans catégorie')
+    genres = analyser_listes(df_movies['genres'])
+    df_movies['genres'] = genres.listes().to_numpy()
+    df_movies['budget'] = df_movies['budget'].fillna(budget_moyen)  # on remplit les valeurs manquantes avec la moyenne
+    return genres
+
+
+def encoder_genres(genres, n_lignes):
+    # One-hot encoding creux des genres (colonnes triées comme pd.get_dummies)
+    genre_columns, codes = np.unique(genres.valeurs.astype(str), return_inverse=True)
+    lignes = genres.lignes()
+    matrice = sp.csr_matrix((np.ones(len(codes), dtype=np.float32), (lignes, codes.ravel())),
+                            shape=(n_lignes, len(genre_columns)))
+    return matrice, genre_columns.tolist()
+
+
+class ModeleKNN:
+    # Normalisation, matrice des features et index de recherche d'une version du jeu de données.
+    # Les films ne sont pas chargés pour servir des résultats : films() ne lit dans le snapshot (mmap) que les
+    # lignes renvoyées ; df_movies (tous les films décodés) n'est construit que si on le demande.
+    def __init__(self, scaler, X, feature_columns, tconst, version, df_movies=None):
+        self.scaler = scaler
+        self.X = X
+        self.feature_columns = feature_columns
+        self.genre_columns = feature_columns[len(numeric_features):]
+        self.tconst = tconst
+        self.version = version
+        self.revision = 0  # incrémentée à chaque ajout de films (voir knn_ajouts)
+        self.derive = 0.0
+        self._df_movies = df_movies
+        self._budget_moyen = None
+        self._verrou = threading.Lock()
+        self._index = {}
+        self._model = None
+
+    @property
+    def model(self):
+        # Modèle sklearn historique, construit seulement si on le demande
+        with self._verrou:
+            if self._model is None:
+                self._model = NearestNeighbors(n_neighbors=5, metric='euclidean').fit(self.X.tocsr())
+            return self._model
+
+    def obtenir_index(self, nom=None, **params):
+        # Index de recherche construit au premier usage, un par (nom, paramètres)
+        nom = nom or INDEX_PAR_DEFAUT
+        cle = (nom, tuple(sorted(params.items())))
+        with self._verrou:
+            if cle not in self._index:
+                self._index[cle] = knn_index.creer_index(nom, **params).ajuster(self.X)
+            return self._index[cle]
+
+    @property
+    def df_movies(self):
+        with self._verrou:
+            if self._df_movies is None:
+                df_movies, _ = preparer_films()
+                if not np.array_equal(df_movies['tconst'].to_numpy().astype(str), self.tconst):
+                    raise RuntimeError("Les films ne correspondent plus à l'artefact du modèle")
+                self._df_movies = df_movies
+            return self._df_movies
+
+    def films(self, positions):
+        # Lignes de df_movies aux positions données (index : les positions), sans décoder les autres films
+        positions = np.asarray(positions, dtype=np.int64)
+        with self._verrou:
+            df_movies = self._df_movies
+        if df_movies is not None:
+            return df_movies.iloc[positions]
+        films = ingestion.charger_snapshot("tconst", lignes=positions)
+        if not np.array_equal(films['tconst'].to_numpy().astype(str), self.tconst[positions]):
+            raise RuntimeError("Les films ne correspondent plus à l'artefact du modèle")
+        _nettoyer(films, self.budget_moyen)
+        return films
+
+    def colonnes(self, noms):
+        # Colonnes de df_movies ; sans df_movies en mémoire, lues dans le snapshot (mmap pour les colonnes numériques)
+        with self._verrou:
+            df_movies = self._df_movies
+        if df_movies is not None:
+            return df_movies[noms]
+        return ingestion.charger_snapshot("tconst", colonnes=noms)
+
+    @property
+    def budget_moyen(self):
+        # Valeur donnée aux budgets manquants, comme dans preparer_films
+        if self._budget_moyen is None:
+            self._budget_moyen = self.colonnes(['budget'])['budget'].mean()
+        return self._budget_moyen
+
+
+def construire_modele():
+    df_movies, genres = preparer_films()
+
+    # Préparation des features : bloc numérique normalisé (float32) et genres en matrice creuse
+    genres_creux, genre_columns = encoder_genres(genres, len(df_movies))
+    feature_columns = numeric_features + genre_columns
+    scaler = MinMaxScaler()
+    numeriques = scaler.fit_transform(df_movies[numeric_features].astype('float64').fillna(0).to_numpy())
+    X = MatriceFeatures(numeriques, genres_creux)
+
+    return ModeleKNN(scaler, X, feature_columns, df_movies['tconst'].to_numpy().astype(str),
+                     _version_modele(), df_movies)
+
+
+# Artefact sur disque : blocs de features, bornes du scaler et ordre des colonnes.
+# Les tableaux sont relus en mmap : les processus qui servent le même modèle partagent les mêmes pages
+# (cache du système) et le démarrage ne lit presque rien.
+def _version_modele():
+    return f"knn-v{VERSION_MODELE}-{ingestion.version('tconst')}"
+
+
+def dossier_modele(version):
+    return os.path.join(chargement.DOSSIER_CACHE, "modeles", version)
+
+
+def sauver_modele(modele):
+    tableaux = {
+        "numeriques_t": modele.X.numeriques.T,  # transposé : relu en ordre colonnes sans copie
+        "genres_valeurs": modele.X.genres.data,
+        "genres_colonnes": modele.X.genres.indices,
+        "genres_lignes": modele.X.genres.indptr,
+        "normes_genres": modele.X.normes_genres,
+        "tconst": modele.tconst,
+        "min": modele.scaler.data_min_,
+        "max": modele.scaler.data_max_,
+    }
+    meta = {"version": modele.version, "feature_columns": modele.feature_columns}
+    ingestion.sauver_tableaux(dossier_modele(modele.version), tableaux, meta)
+
+
+def charger_modele(version):
+    dossier = dossier_modele(version)
+    meta = ingestion.lire_meta(dossier)
+    scaler = MinMaxScaler()
+    scaler.fit(np.vstack([ingestion.charger_tableau(dossier, "min", mmap=False),
+                          ingestion.charger_tableau(dossier, "max", mmap=False)]))
+    numeriques = ingestion.charger_tableau(dossier, "numeriques_t").T
+    genres = sp.csr_matrix((ingestion.charger_tableau(dossier, "genres_valeurs"),
+                            ingestion.charger_tableau(dossier, "genres_colonnes"),
+                            ingestion.charger_tableau(dossier, "genres_lignes")),
+                           shape=(len(numeriques), len(meta["feature_columns"]) - len(numeric_features)), copy=False)
+    X = MatriceFeatures(numeriques, genres, ingestion.charger_tableau(dossier, "normes_genres"))
+    return ModeleKNN(scaler, X, meta["feature_columns"], ingestion.charger_tableau(dossier, "tconst"), meta["version"])
+
+
+_modele = None
+_verrou = threading.Lock()
+
+
+def obtenir_modele():
+    # Modèle construit au premier appel, relu depuis l'artefact s'il existe pour cette version des données
+    global _modele
+    version = _version_modele()
+    with _verrou:
+        if _modele is None or _modele.version != version:
+            if os.path.exists(os.path.join(dossier_modele(version), "meta.json")):
+                _modele = charger_modele(version)
+            else:
+                _modele = construire_modele()
+                sauver_modele(_modele)
+        return _modele
+
+
+def construire_requetes(modele, rates, years, runtimes, budgets, genres, scaler=None):
+    # Requêtes au même format que les features (une ligne par requête), construites sans boucle Python
+    scaler = modele.scaler if scaler is None else scaler
+    numeric_array = np.column_stack([rates, years, runtimes, budgets]).astype('float64')
+
+    # Attribution du genre sélectionné (les genres inconnus sont ignorés)
+    positions = pd.Index(modele.genre_columns).get_indexer(pd.Index(genres, dtype=object))
+    connus = np.flatnonzero(positions >= 0)
+    genres_creux = sp.csr_matrix((np.ones(len(connus), dtype=np.float32), (connus, positions[connus])),
+                                 shape=(len(numeric_array), len(modele.genre_columns)))
+    return MatriceFeatures(scaler.transform(numeric_array), genres_creux)
+
+
+class CacheRequetes:
+    # Résultats (positions des films) des dernières requêtes, avec éviction LRU au-delà de taille entrées
+    def __init__(self, taille=TAILLE_CACHE_REQUETES):
+        self.taille = taille
+        self.succes = 0
+        self.echecs = 0
+        self._resultats = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle):
+        with self._verrou:
+            resultat = self._resultats.get(cle)
+            if resultat is None:
+                self.echecs += 1
+                return None
+            self._resultats.move_to_end(cle)
+            self.succes += 1
+            return resultat
+
+    def ajouter(self, cle, resultat):
+        with self._verrou:
+            self._resultats[cle] = resultat
+            self._resultats.move_to_end(cle)
+            while len(self._resultats) > self.taille:
+                self._resultats.popitem(last=False)
+
+    def vider(self):
+        with self._verrou:
+            self._resultats.clear()
+
+    def statistiques(self):
+        with self._verrou:
+            return {"entrees": len(self._resultats), "succes": self.succes, "echecs": self.echecs}
+
+
+cache_requetes = CacheRequetes()
+
+
+def quantifier(rate, year, runtime, budget, selected_genre):
+    # Entrées ramenées à un nombre entier de pas (clé du cache) et valeurs arrondies correspondantes
+    crans = tuple(int(round(float(valeur) / PAS_QUANTIFICATION[nom]))
+                  for nom, valeur in zip(('rate', 'year', 'runtime', 'budget'), (rate, year, runtime, budget)))
+    valeurs = [cran * pas for cran, pas in zip(crans, PAS_QUANTIFICATION.values())]
+    genre = str(selected_genre).strip()
+    return crans + (genre,), valeurs + [genre]
+
+
+def _chercher(modele, requetes, k, index, filtres, genres_stricts=None):
+    # Avec des filtres (décennie, langue, votes minimum, genre), recherche exacte parmi les seuls films qui les passent ;
+    # genres_stricts : genre de chaque requête, cherchée seulement dans la partition de ce genre
+    if genres_stricts is not None:
+        return knn_filtres.chercher_par_genre(modele, requetes, k, genres_stricts, filtres)
+    if filtres:
+        return knn_filtres.chercher(modele, requetes, k, filtres)
+    return modele.obtenir_index(index).chercher(requetes, k)
+
+
+def get_movie_recommendations(rate, year, runtime, budget, selected_genre, df=None, model=None, scaler=None, index=None,
+                              filtres=None, genre_strict=False):
+    modele = obtenir_modele()
+    genres_stricts = [selected_genre] if genre_strict else None
+
+    # Requêtes standard : résultat servi par le cache s'il est déjà connu pour cette version du modèle
+    if df is None and model is None and scaler is None:
+        cle, valeurs = quantifier(rate, year, runtime, budget, selected_genre)
+        cle = ((modele.version, modele.revision, index or INDEX_PAR_DEFAUT) + cle + knn_filtres.normaliser(filtres)
+               + (genre_strict,))
+        positions = cache_requetes.obtenir(cle)
+        if positions is None:
+            requetes = construire_requetes(modele, *[[v] for v in valeurs])
+            positions = _chercher(modele, requetes, 5, index, filtres, genres_stricts)[1][0]
+            positions = positions[positions >= 0]  # places vides d'un genre strict trop petit
+            cache_requetes.ajouter(cle, positions)
+        return modele.films(positions)
+
+    input_features = construire_requetes(modele, [rate], [year], [runtime], [budget], [selected_genre], scaler)
+
     # Recherche des films similaires
-    distances, indices = model.kneighbors([input_features])
-    
-    return df.iloc[indices[0]]
+    if filtres or genre_strict:
+        distances, indices = _chercher(modele, input_features, 5, index, filtres, genres_stricts)
+    elif model is not None:
+        distances, indices = model.kneighbors(input_features.tocsr())
+    else:
+        distances, indices = modele.obtenir_index(index).chercher(input_features, 5)
+
+    positions = indices[0][indices[0] >= 0]
+    return modele.films(positions) if df is None else df.iloc[positions]
+
+
+def recommander_lot(rates, years, runtimes, budgets, genres, k=5, index=None, filtres=None, genre_strict=False):
+    # Recommandations pour un lot de requêtes avec une seule recherche de voisins (une par genre si genre_strict).
+    # Résultat : une ligne par (requête, rang), avec la distance et les colonnes du film.
+    modele = obtenir_modele()
+    requetes = construire_requetes(modele, rates, years, runtimes, budgets, genres)
+    distances, indices = _chercher(modele, requetes, k, index, filtres, list(genres) if genre_strict else None)
+    k = indices.shape[1]  # moins de k films si les filtres en laissent moins
+
+    # Places vides (indice -1) : genre strict avec moins de k films, ces lignes sont retirées
+    remplies = indices.ravel() >= 0
+    films = modele.films(indices.ravel()[remplies]).reset_index(drop=True)
+    resultat = pd.DataFrame({
+        'requete': np.repeat(np.arange(len(requetes)), k)[remplies],
+        'rang': np.tile(np.arange(1, k + 1), len(requetes))[remplies],
+        'distance': distances.ravel()[remplies],
+    })
+    return pd.concat([resultat, films], axis=1)
+
+
+# Compatibilité : les anciens attributs du module (df_movies, X, model...) sont construits au premier accès
+def __getattr__(nom):
+    if nom in ('df_movies', 'scaler', 'model', 'feature_columns', 'genre_columns'):
+        return getattr(obtenir_modele(), nom)
+    if nom == 'X':
+        modele = obtenir_modele()
+        return pd.DataFrame(modele.X.toarray(), columns=modele.feature_columns)
+    raise AttributeError(f"module {__name__!r} has no attribute {nom!r}")
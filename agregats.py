@@ -0,0 +1,224 @@
+# bibliothèques
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import chargement
+import ingestion
+import registre
+from listes import analyser_listes
+
+# Tables agrégées calculées une fois par version du jeu de données, puis relues en mmap.
+# Elles sont rangées à côté des snapshots et partagées entre les sessions via le registre.
+
+TOUTES = 0  # décennie fictive qui regroupe toutes les décennies
+GENRES_CASTING = ["actor", "actress"]
+
+_verrou = threading.Lock()
+
+
+def _table_derivee(nom_table, construire, sources=("tconst",)):
+    # Renvoie les tableaux de la table (en mmap), en la construisant si besoin ; la clé contient la version
+    # de chaque jeu de données lu par construire
+    dossier = os.path.join(chargement.DOSSIER_CACHE, "agregats",
+                           "-".join([nom_table] + [ingestion.version(source) for source in sources]))
+    if not os.path.exists(os.path.join(dossier, "meta.json")):
+        with _verrou:
+            if not os.path.exists(os.path.join(dossier, "meta.json")):
+                tableaux, meta = construire()
+                ingestion.sauver_tableaux(dossier, tableaux, meta)
+    meta = ingestion.lire_meta(dossier)
+    return {nom: ingestion.charger_tableau(dossier, nom) for nom in meta["tableaux"]}
+
+
+# Apparitions des acteurs et actrices par décennie
+def _construire_apparitions():
+    films = ingestion.charger_snapshot("tconst", colonnes=["decade", "actor", "actress"])
+    morceaux = []
+    for code, colonne in enumerate(GENRES_CASTING):
+        personnes = analyser_listes(films[colonne]).exploser()
+        casting = pd.DataFrame({
+            "nconst": personnes.to_numpy(),
+            "decade": films.loc[personnes.index, "decade"].to_numpy(),
+        })
+        par_decennie = casting.groupby(["nconst", "decade"]).size().rename("nb_films").reset_index()
+        toutes = casting.groupby("nconst").size().rename("nb_films").reset_index()
+        toutes["decade"] = TOUTES
+        table = pd.concat([par_decennie, toutes], ignore_index=True)
+        table["genre"] = code
+        morceaux.append(table)
+
+    # Tri par (genre, décennie, nombre de films décroissant, nconst) : un top-k est une simple tranche
+    table = pd.concat(morceaux, ignore_index=True)
+    table = table.sort_values(["genre", "decade", "nb_films", "nconst"],
+                              ascending=[True, True, False, True], kind="stable")
+    cle = table["genre"].to_numpy(np.int32) * 10000 + table["decade"].to_numpy(np.int32)
+    tableaux = {
+        "cle": cle,
+        "nconst": table["nconst"].to_numpy().astype(str),
+        "nb_films": table["nb_films"].to_numpy(np.int32),
+    }
+    return tableaux, {"tableaux": list(tableaux), "genres": GENRES_CASTING}
+
+
+def charger_apparitions():
+    return _table_derivee("apparitions", _construire_apparitions)
+
+
+def top_personnes(genre, decennie=None, k=10):
+    # Les k personnes ('actor' ou 'actress') présentes dans le plus de films, pour une décennie ou toutes
+    with registre.acquerir("apparitions") as poignee:
+        table = poignee.valeur
+    c = GENRES_CASTING.index(genre) * 10000 + (TOUTES if decennie is None else decennie)
+    debut = np.searchsorted(table["cle"], c, side="left")
+    fin = min(np.searchsorted(table["cle"], c, side="right"), debut + k)
+    return pd.DataFrame({
+        "nconst": table["nconst"][debut:fin].astype(object),
+        "nb_films": np.asarray(table["nb_films"][debut:fin]),
+    })
+
+
+# Cube décennie x langue x tranche de votes x genre
+TOUS_GENRES = "*"  # genre fictif : chaque film y est compté une seule fois
+TRANCHES_VOTE = ["<1000", "1000-10000", ">10000"]
+SEUILS_VOTE = [1000, 10000]
+DIMENSIONS_CUBE = ["decade", "original_language", "tranche_vote", "genre"]
+
+
+def _construire_cube():
+    films = ingestion.charger_snapshot(
+        "tconst", colonnes=["decade", "original_language", "vote", "rate", "budget", "runtimeMinutes", "genres"])
+    films["original_language"] = films["original_language"].astype(object).fillna("")
+    films["tranche_vote"] = np.searchsorted(SEUILS_VOTE, films["vote"].to_numpy(), side="right")
+
+    # Chaque film apparaît une fois par genre, et une fois dans le genre TOUS_GENRES
+    genres = analyser_listes(films["genres"]).exploser()
+    faits = pd.concat([
+        films.assign(genre=TOUS_GENRES),
+        films.loc[genres.index].assign(genre=genres.to_numpy()),
+    ], ignore_index=True)
+
+    cube = faits.groupby(DIMENSIONS_CUBE, sort=True).agg(
+        nb_films=("rate", "size"),
+        somme_rate=("rate", "sum"),
+        somme_budget=("budget", "sum"),
+        nb_budget=("budget", "count"),
+        somme_runtime=("runtimeMinutes", "sum"),
+    ).reset_index()
+
+    tableaux = {
+        "decade": cube["decade"].to_numpy(np.int16),
+        "original_language": cube["original_language"].to_numpy().astype(str),
+        "tranche_vote": cube["tranche_vote"].to_numpy(np.int8),
+        "genre": cube["genre"].to_numpy().astype(str),
+        "nb_films": cube["nb_films"].to_numpy(np.int32),
+        "somme_rate": cube["somme_rate"].to_numpy(np.float64),
+        "somme_budget": cube["somme_budget"].to_numpy(np.float64),
+        "nb_budget": cube["nb_budget"].to_numpy(np.int32),
+        "somme_runtime": cube["somme_runtime"].to_numpy(np.float64),
+    }
+    return tableaux, {"tableaux": list(tableaux), "tranches_vote": TRANCHES_VOTE}
+
+
+def charger_cube():
+    tableaux = _table_derivee("cube", _construire_cube)
+    cube = pd.DataFrame({nom: np.asarray(t) for nom, t in tableaux.items()})
+    cube["original_language"] = cube["original_language"].astype(object).replace("", np.nan)
+    cube["tranche_vote"] = np.array(TRANCHES_VOTE, dtype=object)[cube["tranche_vote"]]
+    return cube
+
+
+def cube(genre=TOUS_GENRES):
+    # Tranche du cube pour un genre (par défaut tous les films, chacun compté une fois)
+    with registre.acquerir("cube") as poignee:
+        cube_complet = poignee.valeur
+    return cube_complet[cube_complet["genre"] == genre]
+
+
+def compter_par(tranche, dimension):
+    # Nombre de films par valeur de la dimension, du plus fréquent au moins fréquent
+    comptes = tranche.groupby(dimension)["nb_films"].sum()
+    return comptes[comptes > 0].sort_values(ascending=False, kind="stable")
+
+
+# Âge des acteurs et actrices au moment du film, par décennie
+AGES = np.arange(1, 100)
+
+
+def _construire_ages():
+    films = ingestion.charger_snapshot("tconst", colonnes=["year", "decade", "actor", "actress"])
+    personnes = ingestion.charger_snapshot("nconst", colonnes=["nconst", "birthYear"])
+
+    # Une ligne par acteur ou actrice, pour les films où les deux listes sont renseignées
+    films = films.dropna(subset=["actor", "actress"])
+    casting = pd.concat([analyser_listes(films["actor"]).exploser(),
+                         analyser_listes(films["actress"]).exploser()])
+    casting = films[["year", "decade"]].join(casting.rename("nconst"), how="inner")
+    casting = casting.merge(personnes, how="left", on="nconst")
+
+    age = (casting["year"] - casting["birthYear"]).to_numpy()
+    garde = (age >= AGES[0]) & (age <= AGES[-1])
+    age = age[garde].astype(np.int64)
+    decennie = casting["decade"].to_numpy()[garde]
+
+    decennies = np.arange(films["decade"].min(), films["decade"].max() + 10, 10, dtype=np.int16)
+    comptes = np.zeros((len(decennies), len(AGES)), dtype=np.int32)
+    np.add.at(comptes, (np.searchsorted(decennies, decennie), age - AGES[0]), 1)
+    tableaux = {"decennies": decennies, "comptes": comptes}
+    return tableaux, {"tableaux": list(tableaux), "ages": [int(AGES[0]), int(AGES[-1])]}
+
+
+def charger_ages():
+    return _table_derivee("ages", _construire_ages, sources=("tconst", "nconst"))
+
+
+def histogramme_ages(decennie=None):
+    # Nombre d'apparitions par âge (1 à 99 ans), pour une décennie ou toutes
+    with registre.acquerir("ages") as poignee:
+        table = poignee.valeur
+    if decennie is None:
+        comptes = np.asarray(table["comptes"]).sum(axis=0)
+    else:
+        position = np.flatnonzero(table["decennies"] == decennie)
+        comptes = np.asarray(table["comptes"][position[0]]) if len(position) else np.zeros(len(AGES), np.int32)
+    return pd.Series(comptes, index=AGES, name="age")
+
+
+# Meilleurs éléments par groupe
+TAILLE_MEMO_TOP_K = 64
+_memo_top_k = OrderedDict()
+
+
+def top_k_par_groupe(df, colonne, k=1, cles=(), croissant=False, cle_cache=None):
+    # Les k meilleures lignes de chaque groupe, obtenues avec un seul tri puis la tête de chaque groupe.
+    # Les égalités gardent l'ordre d'origine des lignes (comme nlargest). Si cle_cache est donnée
+    # (elle doit identifier les données, par exemple avec la version du jeu), le résultat est mémorisé.
+    cles = list(cles)
+    if cle_cache is not None:
+        cle = (cle_cache, colonne, k, tuple(cles), croissant)
+        with _verrou:
+            if cle in _memo_top_k:
+                _memo_top_k.move_to_end(cle)
+                return _memo_top_k[cle]
+
+    lignes = df[df[colonne].notna()]
+    ordre = lignes.sort_values(cles + [colonne], ascending=[True] * len(cles) + [croissant], kind="stable")
+    if cles:
+        resultat = ordre.groupby(cles, sort=False).head(k).reset_index(drop=True)
+    else:
+        resultat = ordre.head(k)
+
+    if cle_cache is not None:
+        with _verrou:
+            _memo_top_k[cle] = resultat
+            while len(_memo_top_k) > TAILLE_MEMO_TOP_K:
+                _memo_top_k.popitem(last=False)
+    return resultat
+
+
+registre.enregistrer("apparitions", charger_apparitions, version=lambda: ingestion.version("tconst"))
+registre.enregistrer("cube", charger_cube, version=lambda: ingestion.version("tconst"))
+registre.enregistrer("ages", charger_ages, version=lambda: (ingestion.version("tconst"), ingestion.version("nconst")))
@@ -0,0 +1,127 @@
+# bibliothèques
+import time
+
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+import KNN
+import knn_compression
+import knn_filtres
+import knn_index
+import knn_shards
+
+# Bancs d'essai du recommandeur, sur les données du modèle courant :
+#   python banc_knn.py
+
+
+def requetes_test(modele, n_requetes=1000, bruit=0.05, graine=0):
+    # Films tirés au hasard, légèrement déplacés (mêmes genres, valeurs numériques bruitées)
+    rng = np.random.default_rng(graine)
+    requetes = modele.X[np.sort(rng.choice(len(modele.X), n_requetes))]
+    requetes.numeriques += rng.normal(0, bruit, requetes.numeriques.shape).astype(np.float32)
+    return requetes
+
+
+def chronometrer(fonction, repetitions=3):
+    # Meilleur temps sur quelques répétitions, et le résultat
+    meilleur = np.inf
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction()
+        meilleur = min(meilleur, time.perf_counter() - debut)
+    return meilleur, resultat
+
+
+def debit_blas(n_requetes=1000, k=5, metrics=('euclidean', 'cosine'), dtype=np.float64):
+    # Requêtes par seconde de l'index blas et de sklearn (NearestNeighbors sur la matrice dense), et rappel@k
+    modele = KNN.obtenir_modele()
+    requetes = requetes_test(modele, n_requetes)
+    X, denses = modele.X.toarray().astype(np.float64), requetes.toarray().astype(np.float64)
+    lignes = []
+    for metric in metrics:
+        sklearn = NearestNeighbors(metric=metric).fit(X)
+        temps_sklearn, (_, attendus) = chronometrer(lambda: sklearn.kneighbors(denses, n_neighbors=k))
+        index = knn_index.IndexBLAS(metric=metric, dtype=dtype).ajuster(modele.X)
+        temps_blas, (_, trouves) = chronometrer(lambda: index.chercher(requetes, k))
+        communs = sum(len(np.intersect1d(a, t)) for a, t in zip(attendus, trouves))
+        lignes.append({
+            "metric": metric,
+            "requetes_s_sklearn": n_requetes / temps_sklearn,
+            "requetes_s_blas": n_requetes / temps_blas,
+            "acceleration": temps_sklearn / temps_blas,
+            "rappel": communs / attendus.size,
+        })
+    return lignes
+
+
+def debit_shards(n_requetes=1000, k=5, n_workers=(1, 2, 4, 8)):
+    # Requêtes par seconde de la recherche répartie selon le nombre de processus (une tranche par processus)
+    modele = KNN.obtenir_modele()
+    requetes = requetes_test(modele, n_requetes)
+    lignes = []
+    for n in n_workers:
+        index = knn_shards.IndexShards(n_workers=n).ajuster(modele.X)
+        try:
+            index.chercher(requetes[:1], k)  # démarrage des processus
+            temps, _ = chronometrer(lambda: index.chercher(requetes, k))
+        finally:
+            index.fermer()
+        lignes.append({"processus": n, "requetes_s": n_requetes / temps})
+    return lignes
+
+
+def compression(n_requetes=1000, k=5, configurations=(("pca", None), ("pca", 4), ("projection", None))):
+    # Mémoire de l'index compressé par rapport à la matrice float64 d'origine et aux features actuelles,
+    # et rappel@k par rapport à la recherche exacte
+    modele = KNN.obtenir_modele()
+    requetes = requetes_test(modele, n_requetes)
+    _, attendus = modele.obtenir_index("exact").chercher(requetes, k)
+    octets_float64 = modele.X.shape[0] * modele.X.shape[1] * 8
+    lignes = []
+    for methode, dimension in configurations:
+        index = knn_compression.IndexCompresse(methode=methode, dimension=dimension).ajuster(modele.X)
+        temps, (_, trouves) = chronometrer(lambda: index.chercher(requetes, k), repetitions=1)
+        communs = sum(len(np.intersect1d(a, t)) for a, t in zip(attendus, trouves))
+        lignes.append({
+            "methode": methode,
+            "dimensions": index.codes.shape[1],
+            "octets": index.nbytes,
+            "gain_vs_float64": octets_float64 / index.nbytes,
+            "gain_vs_features": modele.X.nbytes / index.nbytes,
+            "rappel": communs / attendus.size,
+            "requetes_s": n_requetes / temps,
+        })
+    return lignes
+
+
+def genre_strict(n_requetes=1000, k=5):
+    # Temps par requête de la recherche stricte par genre (partition du genre seulement) par rapport à la recherche
+    # exacte sur tous les films, selon la part des films dans le genre
+    modele = KNN.obtenir_modele()
+    requetes = requetes_test(modele, n_requetes)
+    partitions = knn_filtres.partitions(modele)
+    temps_complet, _ = chronometrer(lambda: modele.obtenir_index("exact").chercher(requetes, k))
+    lignes = []
+    for genre, films in sorted(partitions.genres.items(), key=lambda g: -len(g[1])):
+        genres = [genre] * n_requetes
+        temps, (_, indices) = chronometrer(lambda: knn_filtres.chercher_par_genre(modele, requetes, k, genres))
+        lignes.append({
+            "genre": genre,
+            "part_films": len(films) / len(modele.X),
+            "ms_requete": temps / n_requetes * 1000,
+            "acceleration": temps_complet / temps,
+            "hors_genre": int(np.isin(indices, films, invert=True).sum()),
+        })
+    return lignes
+
+
+if __name__ == "__main__":
+    for dtype in (np.float64, np.float32):
+        for ligne in debit_blas(dtype=dtype):
+            print(np.dtype(dtype).name, ligne)
+    for ligne in debit_shards():
+        print(ligne)
+    for ligne in compression():
+        print(ligne)
+    for ligne in genre_strict():
+        print(ligne)
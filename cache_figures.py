@@ -0,0 +1,71 @@
+# bibliothèques
+import io
+import threading
+from collections import OrderedDict
+
+import matplotlib.pyplot as plt
+
+# Cache des graphiques déjà rendus, partagé par toutes les sessions du processus.
+# Les figures sont converties en PNG puis fermées tout de suite : seuls les octets sont gardés,
+# avec éviction LRU dès que le budget mémoire est dépassé.
+
+BUDGET_OCTETS = 64 * 1024 * 1024
+FORMAT = "png"
+DPI = 200  # mêmes réglages que st.pyplot
+
+
+class CacheFigures:
+    def __init__(self, budget_octets=BUDGET_OCTETS, format=FORMAT, dpi=DPI):
+        self.budget_octets = budget_octets
+        self.format = format
+        self.dpi = dpi
+        self.octets = 0
+        self.succes = 0
+        self.echecs = 0
+        self._images = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def obtenir(self, cle):
+        # Image en cache pour cette clé, ou None
+        with self._verrou:
+            image = self._images.get(cle)
+            if image is None:
+                self.echecs += 1
+                return None
+            self._images.move_to_end(cle)
+            self.succes += 1
+            return image
+
+    def ajouter(self, cle, fig):
+        # Rend la figure, la ferme, garde les octets et les renvoie
+        tampon = io.BytesIO()
+        try:
+            fig.savefig(tampon, format=self.format, dpi=self.dpi, bbox_inches="tight")
+        finally:
+            plt.close(fig)
+        image = tampon.getvalue()
+
+        with self._verrou:
+            ancienne = self._images.pop(cle, None)
+            if ancienne is not None:
+                self.octets -= len(ancienne)
+            if len(image) <= self.budget_octets:
+                self._images[cle] = image
+                self.octets += len(image)
+            while self.octets > self.budget_octets:
+                _, evincee = self._images.popitem(last=False)
+                self.octets -= len(evincee)
+        return image
+
+    def vider(self):
+        with self._verrou:
+            self._images.clear()
+            self.octets = 0
+
+    def statistiques(self):
+        with self._verrou:
+            return {"images": len(self._images), "octets": self.octets,
+                    "succes": self.succes, "echecs": self.echecs}
+
+
+cache = CacheFigures()
@@ -0,0 +1,187 @@
+# bibliothèques
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import urllib.request
+
+import pandas as pd
+
+# Sources des données
+URL_BASE = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/"
+FICHIERS = {
+    "tconst": "tconst.tsv.gz",
+    "nconst": "nconst.tsv.gz",
+}
+
+# Colonnes minimales attendues pour valider un fichier
+COLONNES_ATTENDUES = {
+    "tconst": ["tconst", "year", "title", "genres", "original_language", "vote", "rate"],
+    "nconst": ["nconst", "primaryName", "birthYear"],
+}
+
+# Dossier du cache local (les fichiers y sont rangés sous leur empreinte sha256)
+DOSSIER_CACHE = os.environ.get(
+    "IMDB_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "projet2wild"))
+
+# Mode hors ligne : si défini, les fichiers sont lus dans ce dossier et rien n'est téléchargé
+DOSSIER_HORS_LIGNE = os.environ.get("IMDB_DATA_DIR")
+
+_verrou = threading.Lock()
+_valides = {}  # nom -> (chemin, empreinte) déjà validés dans ce processus
+
+
+# Fonctions utilitaires
+def _sha256(chemin):
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def _chemin_index():
+    return os.path.join(DOSSIER_CACHE, "index.json")
+
+
+def _lire_json(chemin):
+    try:
+        with open(chemin, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _ecrire_json(chemin, contenu):
+    os.makedirs(DOSSIER_CACHE, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=DOSSIER_CACHE, suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(contenu, f, indent=2)
+    os.replace(tmp, chemin)
+
+
+def _lire_index():
+    return _lire_json(_chemin_index())
+
+
+def _ecrire_index(index):
+    _ecrire_json(_chemin_index(), index)
+
+
+def _empreinte_fichier(chemin):
+    # sha256 mémorisée avec la taille et la date de modification du fichier :
+    # un fichier inchangé n'est pas relu à chaque démarrage de processus
+    chemin = os.path.abspath(chemin)
+    etat = os.stat(chemin)
+    chemin_memo = os.path.join(DOSSIER_CACHE, "empreintes.json")
+    memo = _lire_json(chemin_memo)
+    entree = memo.get(chemin)
+    if entree and entree["taille"] == etat.st_size and entree["mtime_ns"] == etat.st_mtime_ns:
+        return entree["empreinte"]
+
+    empreinte = _sha256(chemin)
+    memo[chemin] = {"taille": etat.st_size, "mtime_ns": etat.st_mtime_ns, "empreinte": empreinte}
+    _ecrire_json(chemin_memo, memo)
+    return empreinte
+
+
+def valider(nom, chemin):
+    # Vérifie que le fichier est un gzip lisible et que l'en-tête contient les colonnes attendues
+    try:
+        with gzip.open(chemin, "rt", encoding="utf-8") as f:
+            entete = f.readline().rstrip("\n").split("\t")
+    except (OSError, EOFError, UnicodeDecodeError) as e:
+        raise ValueError(f"Fichier {nom} illisible ({chemin}) : {e}") from e
+    manquantes = [c for c in COLONNES_ATTENDUES.get(nom, []) if c not in entete]
+    if manquantes:
+        raise ValueError(f"Fichier {nom} invalide ({chemin}), colonnes manquantes : {manquantes}")
+
+
+def _telecharger(nom):
+    # Téléchargement dans un fichier temporaire, puis rangement sous son empreinte
+    dossier_objets = os.path.join(DOSSIER_CACHE, "objets")
+    os.makedirs(dossier_objets, exist_ok=True)
+    url = URL_BASE + FICHIERS[nom]
+    fd, tmp = tempfile.mkstemp(dir=dossier_objets, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f, urllib.request.urlopen(url) as reponse:
+            for bloc in iter(lambda: reponse.read(1 << 20), b""):
+                f.write(bloc)
+        valider(nom, tmp)
+        empreinte = _sha256(tmp)
+        chemin = os.path.join(dossier_objets, f"{empreinte}.tsv.gz")
+        os.replace(tmp, chemin)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    index = _lire_index()
+    index[nom] = {"empreinte": empreinte, "url": url, "taille": os.path.getsize(chemin)}
+    _ecrire_index(index)
+    return chemin, empreinte
+
+
+def _depuis_cache(nom):
+    # Renvoie le fichier du cache s'il existe et correspond à l'index, sinon None
+    entree = _lire_index().get(nom)
+    if entree is None:
+        return None
+    chemin = os.path.join(DOSSIER_CACHE, "objets", f"{entree['empreinte']}.tsv.gz")
+    if not os.path.exists(chemin) or os.path.getsize(chemin) != entree["taille"]:
+        return None
+    if _empreinte_fichier(chemin) != entree["empreinte"]:
+        return None
+    valider(nom, chemin)
+    return chemin, entree["empreinte"]
+
+
+def _resoudre(nom):
+    if nom not in FICHIERS:
+        raise KeyError(f"Jeu de données inconnu : {nom!r} (attendu : {sorted(FICHIERS)})")
+    if nom in _valides:
+        return _valides[nom]
+
+    with _verrou:
+        if nom in _valides:
+            return _valides[nom]
+
+        if DOSSIER_HORS_LIGNE:
+            chemin = os.path.join(DOSSIER_HORS_LIGNE, FICHIERS[nom])
+            if not os.path.exists(chemin):
+                raise FileNotFoundError(f"Mode hors ligne : {chemin} introuvable")
+            valider(nom, chemin)
+            resultat = (chemin, _empreinte_fichier(chemin))
+        else:
+            resultat = _depuis_cache(nom) or _telecharger(nom)
+
+        _valides[nom] = resultat
+        return resultat
+
+
+# Fonctions publiques
+def chemin_local(nom):
+    # Chemin sur disque du fichier (téléchargé au premier appel seulement)
+    return _resoudre(nom)[0]
+
+
+def empreinte(nom):
+    # Empreinte sha256 du fichier, qui sert de version du jeu de données
+    return _resoudre(nom)[1]
+
+
+def rafraichir(nom):
+    # Force un nouveau téléchargement au prochain accès
+    with _verrou:
+        _valides.pop(nom, None)
+        index = _lire_index()
+        if index.pop(nom, None) is not None:
+            _ecrire_index(index)
+
+
+def charger_tsv(nom, **options):
+    # Lecture du fichier local avec pandas (mêmes options que pd.read_csv)
+    return pd.read_csv(chemin_local(nom), sep="\t", **options)
@@ -4,7 +4,11 @@ from streamlit_option_menu import option_menu
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import numpy as np
+import ingestion  # enregistre les snapshots tconst/nconst dans le registre
+import agregats
+import densites
+import cache_figures
+import registre
 
 # configuration de la page
 st.set_page_config(
@@ -33,6 +37,24 @@ with col1:
         "Sélectionnez une décennie:",
         decades
     )
+    st.sidebar.caption(f"Mémoire des données partagées : {registre.memoire_totale() / 1e6:.0f} Mo")
+    st.sidebar.caption(f"Graphiques en cache : {cache_figures.cache.statistiques()['images']} ({cache_figures.cache.octets / 1e6:.1f} Mo)")
+
+# Fonction pour charger les données partagées entre toutes les sessions
+def charger_donnees(nom, colonnes):
+    poignees = st.session_state.setdefault('poignees', {})
+    if nom in poignees and poignees[nom].perimee():
+        poignees.pop(nom).liberer()  # jeu de données rafraîchi : la session passe à la nouvelle version
+    if nom not in poignees:
+        poignees[nom] = registre.acquerir(nom)  # une poignée par session, libérée avec elle
+    return poignees[nom].vue(colonnes)
+
+# Clé d'un graphique dans le cache partagé des figures : versions des jeux de données lus par l'onglet
+# (les graphiques des acteurs lisent aussi nconst), et décennie choisie si le graphique en dépend
+def cle_figure(*elements, par_decennie=True):
+    sources = ("tconst", "nconst") if selected_tab == "Acteurs" else ("tconst",)
+    decennie = (selected_decade,) if par_decennie else ()
+    return tuple(ingestion.version(source) for source in sources) + (selected_tab,) + decennie + elements
 
 # Fonction pour filtrer les données par décennie
 def filter_by_decade(df, selected_decade):
@@ -52,18 +74,15 @@ with col2:
     elif selected_tab == "Quantité":
         st.header("Nombre de films par décennie")
         
-        # Chargement des données
-        url = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-        df = pd.read_csv(url, sep='\t')
+        # Chargement des données (cube agrégé, une ligne par décennie x langue x tranche de votes)
+        df = agregats.cube()
         
         # Afficher le nombre total de films
-        total_films = len(df)
+        total_films = int(df['nb_films'].sum())
         st.write(f"**Nombre total de films dans la base : {total_films:}**")
         
         # Préparation des données
-        df['decade'] = (pd.to_datetime(df['year'].astype(str), format='%Y').dt.year // 10) * 10
-        df_actor_decade = df.groupby('decade').size().reset_index(name='nb_films')
-        df_actor_decade = df_actor_decade.set_index('decade')
+        df_actor_decade = df.groupby('decade')['nb_films'].sum().to_frame()
         
         # Filtrer les données selon la décennie sélectionnée
         if selected_decade != "Toutes les décennies":
@@ -71,71 +90,68 @@ with col2:
             df_actor_decade = df_actor_decade[df_actor_decade.index == decade]
         
         # Création du graphique
-        fig, ax = plt.subplots(figsize=(12, 6))
-        sns.barplot(x=df_actor_decade.index.astype(str), y=df_actor_decade['nb_films'], palette="crest", ax=ax)
+        cle = cle_figure()
+        image = cache_figures.cache.obtenir(cle)
+        if image is None:
+            fig, ax = plt.subplots(figsize=(12, 6))
+            sns.barplot(x=df_actor_decade.index.astype(str), y=df_actor_decade['nb_films'], palette="crest", ax=ax)
         
-        # Ajouter les valeurs sur les barres
-        for p in ax.patches:
-            ax.annotate(
-                format(p.get_height(), '.0f'),
-                (p.get_x() + p.get_width() / 2., p.get_height()),
-                ha='center', va='center',
-                xytext=(0, 8),
-                textcoords='offset points',
-                fontsize=10
-            )
+            # Ajouter les valeurs sur les barres
+            for p in ax.patches:
+                ax.annotate(
+                    format(p.get_height(), '.0f'),
+                    (p.get_x() + p.get_width() / 2., p.get_height()),
+                    ha='center', va='center',
+                    xytext=(0, 8),
+                    textcoords='offset points',
+                    fontsize=10
+                )
         
-        # Personnalisation du graphique
-        plt.title("Nombre de films par décennie", fontsize=16)
-        plt.xlabel("Année", fontsize=14)
-        plt.ylabel("Nombre de films", fontsize=14)
+            # Personnalisation du graphique
+            plt.title("Nombre de films par décennie", fontsize=16)
+            plt.xlabel("Année", fontsize=14)
+            plt.ylabel("Nombre de films", fontsize=14)
         
-        # Ajuster les marges
-        plt.tight_layout()
+            # Ajuster les marges
+            plt.tight_layout()
+            image = cache_figures.cache.ajouter(cle, fig)
         
         # Afficher le graphique dans Streamlit
-        st.pyplot(fig)
+        st.image(image, width="stretch")
 
     elif selected_tab == "Budget":
         st.header("Répartition des budgets de 1960 à 2025")
 
-        # Chargement des données
-        url = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-        df = pd.read_csv(url, sep='\t')
-        
-        # Préparation des données
-        df['budget_kde']=df['budget'].apply(lambda x: 10**len(str(x))).apply(lambda x: '<'+str(x))
+        # Chargement des données (parts de chaque tranche de budget par année, précalculées)
+        grille, parts, etiquettes = densites.densite("budget")
 
         # Graphique
-        fig, ax = plt.subplots(figsize = (12,6))
-        sns.kdeplot(
-        data=df.loc[df['budget']>0].sort_values('budget_kde', ascending=False), x="year", hue="budget_kde",
-        multiple="fill", common_norm=True, palette="tab10_r",
-        alpha=.5, linewidth=0,
-        )
+        cle = cle_figure(par_decennie=False)
+        image = cache_figures.cache.obtenir(cle)
+        if image is None:
+            fig, ax = plt.subplots(figsize = (12,6))
+            densites.tracer_parts(ax, grille, parts, etiquettes, palette="tab10_r", alpha=.5)
+            ax.set_xlabel("year")
 
-        plt.sca(ax)
-        plt.title("Répartition des budgets par tranches de 1960 à 2025", size=20)
-        plt.ylabel("Répartition", size=20, labelpad=5)
-        plt.xlim(left=1960, right=2025)
-        box = ax.get_position()
-        ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
-        plt.tight_layout()
+            plt.sca(ax)
+            plt.title("Répartition des budgets par tranches de 1960 à 2025", size=20)
+            plt.ylabel("Répartition", size=20, labelpad=5)
+            plt.xlim(left=1960, right=2025)
+            box = ax.get_position()
+            ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
+            plt.tight_layout()
 
-        # Légende
-        ax.legend(df.sort_values('budget', ascending=True)['budget_kde'].unique(), loc='center left', bbox_to_anchor=(1, 0.5), facecolor='white', reverse=True)
+            # Légende
+            ax.legend(loc='center left', bbox_to_anchor=(1, 0.5), facecolor='white', reverse=True)
+            image = cache_figures.cache.ajouter(cle, fig)
         
         # Affichage
-        st.pyplot(fig)                      
+        st.image(image, width="stretch")                      
     elif selected_tab == "Durée":
         st.header("Répartition de la durée des films 1960 à 2025")
 
-        # Chargement des données
-        url = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-        df = pd.read_csv(url, sep='\t')
-        
-        # Préparation des données
-        df['runtime_kde']=df['runtimeMinutes'].apply(lambda x: int(((1+x//30)*30))).apply(lambda x: '<'+str(x))
+        # Chargement des données (parts de chaque tranche de durée par année, précalculées)
+        grille, parts, etiquettes = densites.densite("duree")
                   
                                                                                                       
                   
@@ -143,26 +159,27 @@ with col2:
                                                                                         
 
         # Graphique
-        fig, ax = plt.subplots(figsize = (12,6))
-        sns.kdeplot(
-        data=df.sort_values('runtimeMinutes', ascending=False), x="year", hue="runtime_kde",
-        multiple="fill", common_norm=True, palette="tab10_r",
-        alpha=.5, linewidth=0,
-        )
+        cle = cle_figure(par_decennie=False)
+        image = cache_figures.cache.obtenir(cle)
+        if image is None:
+            fig, ax = plt.subplots(figsize = (12,6))
+            densites.tracer_parts(ax, grille, parts, etiquettes, palette="tab10_r", alpha=.5)
+            ax.set_xlabel("year")
 
-        plt.sca(ax)
-        plt.title("Répartition des durées de films de 1960 à 2025", size=20)
-        plt.ylabel("Répartition", size=20, labelpad=5)
-        plt.xlim(left=1960, right=2025)
-        box = ax.get_position()
-        ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
-        plt.tight_layout()
+            plt.sca(ax)
+            plt.title("Répartition des durées de films de 1960 à 2025", size=20)
+            plt.ylabel("Répartition", size=20, labelpad=5)
+            plt.xlim(left=1960, right=2025)
+            box = ax.get_position()
+            ax.set_position([box.x0, box.y0, box.width * 0.8, box.height])
+            plt.tight_layout()
 
-        # Légende
-        ax.legend(df.sort_values('runtimeMinutes', ascending=True)['runtime_kde'].unique(), loc='center left', bbox_to_anchor=(1, 0.5), facecolor='white', reverse=True)
+            # Légende
+            ax.legend(loc='center left', bbox_to_anchor=(1, 0.5), facecolor='white', reverse=True)
+            image = cache_figures.cache.ajouter(cle, fig)
         
         # Affichage
-        st.pyplot(fig)
+        st.image(image, width="stretch")
     elif selected_tab == "Acteurs":
         # Sous-menu pour les acteurs
         acteurs_submenu = st.radio(
@@ -172,45 +189,26 @@ with col2:
         
         if acteurs_submenu == "Âge des acteurs":
             st.header("Âge des acteurs par décennie")
-            # Chargement des données
-            url = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/nconst.tsv.gz"
-            df = pd.read_csv(url, sep='\t', low_memory=False, na_values=['\\N'])
-            
-            url2 = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-            df2 = pd.read_csv(url2, sep='\t', low_memory=False, na_values=['\\N'])
-            df2.drop(columns=['tconst', 'runtimeMinutes', 'title', 'director', 'writer', 'budget', 'id', 'original_language',
-            'production_countries', 'revenue', 'spoken_languages', 'genres', 'vote',
-            'rate', 'rank'], axis=1, inplace=True)
-            # Préparation des données
-
-            df2['actor']=df2['actor'].dropna().apply(lambda x: x.replace("'","").replace("[","").replace("]","").split(",")).apply(lambda x: list(filter(None, [ele.strip() for ele in x])))
-            df2['actress']=df2['actress'].dropna().apply(lambda x: x.replace("'","").replace("[","").replace("]","").split(",")).apply(lambda x: list(filter(None, [ele.strip() for ele in x])))
-            df2['actorress']=df2['actor']+df2['actress']
-            df2.drop(columns=['actor','actress'], axis=1, inplace=True)
-            df2=df2.dropna(subset=['actorress']).explode(column='actorress')
-            df2=pd.merge(left=df2, right=df[['nconst','birthYear']], how='left', left_on='actorress', right_on='nconst')
-            df2['age']=df2['year']-df2['birthYear']
-            df2.drop(columns=['actorress', 'nconst', 'birthYear'], axis=1, inplace=True)
-            df2['age']=df2['age'].apply(lambda x: np.nan if (x<1) else x)
-            df2.dropna(subset=['age'], inplace=True)
-            df2['age']=df2['age'].astype('int16')
-            df2['age_kde']=df2['age'].apply(lambda x: (((x-1)//10)+1)*10).apply(lambda x: '<'+str(x))
-            # Préparation des données
-            df2['decade'] = (pd.to_datetime(df2['year'].astype(str), format='%Y').dt.year // 10) * 10
+            # Chargement des données (histogrammes des âges précalculés, de 1 à 99 ans)
             decade_text = "toutes décennies confondues" if selected_decade == "Toutes les décennies" else f"dans les années {selected_decade}"
             # Filtrer les données selon la décennie sélectionnée
             if selected_decade == "Toutes les décennies":
-                fig, ax = plt.subplots(figsize=(12, 6))
-                sns.histplot(df2.loc[df2['age']<100]['age'], bins=range(1,100,1), ax=ax)
+                cle = cle_figure(acteurs_submenu)
+                image = cache_figures.cache.obtenir(cle)
+                if image is None:
+                    fig, ax = plt.subplots(figsize=(12, 6))
+                    ages = agregats.histogramme_ages()
+                    sns.histplot(x=ages.index, weights=ages.to_numpy(), bins=range(1,100,1), ax=ax)
 
         
-                # Personnalisation du graphique
-                plt.title(f"Age des acteurs {decade_text}", fontsize=16)
-                plt.xlabel("Année", fontsize=14)
-                plt.ylabel("Nombres", fontsize=14)
+                    # Personnalisation du graphique
+                    plt.title(f"Age des acteurs {decade_text}", fontsize=16)
+                    plt.xlabel("Année", fontsize=14)
+                    plt.ylabel("Nombres", fontsize=14)
         
-                # Ajuster les marges
-                plt.tight_layout()
+                    # Ajuster les marges
+                    plt.tight_layout()
+                    image = cache_figures.cache.ajouter(cle, fig)
 
                 # Afficher le graphique dans Streamlit
                                                          
@@ -234,7 +232,7 @@ with col2:
                  
                     
                
-                st.pyplot(fig)
+                st.image(image, width="stretch")
 
                                        
                       
@@ -256,20 +254,25 @@ with col2:
                                      
             else:
                 decade = int(selected_decade[:-1])
-                fig, ax = plt.subplots(figsize=(12, 6))
-                sns.histplot(df2.loc[(df2['age']<100)&(df2['decade']==decade)]['age'], bins=range(1,100,1), ax=ax)
+                cle = cle_figure(acteurs_submenu)
+                image = cache_figures.cache.obtenir(cle)
+                if image is None:
+                    fig, ax = plt.subplots(figsize=(12, 6))
+                    ages = agregats.histogramme_ages(decade)
+                    sns.histplot(x=ages.index, weights=ages.to_numpy(), bins=range(1,100,1), ax=ax)
 
         
-                # Personnalisation du graphique
-                plt.title(f"Âge des acteurs {decade_text}", fontsize=16)
-                plt.xlabel("Année", fontsize=14)
-                plt.ylabel("Nombres", fontsize=14)
+                    # Personnalisation du graphique
+                    plt.title(f"Âge des acteurs {decade_text}", fontsize=16)
+                    plt.xlabel("Année", fontsize=14)
+                    plt.ylabel("Nombres", fontsize=14)
         
-                # Ajuster les marges
-                plt.tight_layout()
+                    # Ajuster les marges
+                    plt.tight_layout()
+                    image = cache_figures.cache.ajouter(cle, fig)
 
                 # Afficher le graphique dans Streamlit
-                st.pyplot(fig)            
+                st.image(image, width="stretch")
 
 # ------
 
@@ -319,38 +322,11 @@ with col2:
                 column_name = 'actress'
             
             # Chargement des données
-            url = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/nconst.tsv.gz"
-            df = pd.read_csv(url, sep='\t', low_memory=False, na_values=['\\N'])
-            
-            url2 = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-            df2 = pd.read_csv(url2, sep='\t', low_memory=False, na_values=['\\N'])
-            
-            # Préparation des données
-            df2['decade'] = df2['year'].apply(lambda x: int((x // 10) * 10))
-            
-            # Traitement des données
-            persons = df2[column_name].dropna().apply(lambda x: x.replace("'","").replace("[","").replace("]","").split(",")).apply(lambda x: list(filter(None, [ele.strip() for ele in x])))
+            df = charger_donnees("nconst", ['nconst', 'primaryName'])
             
-            # Créer un DataFrame avec les personnes et leurs décennies
-            person_decades = []
-            for idx, row in df2.iterrows():
-                if pd.notna(row[column_name]):
-                    persons = row[column_name].replace("'","").replace("[","").replace("]","").split(",")
-                    persons = [p.strip() for p in persons if p.strip()]
-                    for person in persons:
-                        person_decades.append({'person': person, 'decade': row['decade']})
-            
-            person_decades_df = pd.DataFrame(person_decades)
-            
-            # Filtrer par décennie si nécessaire
-            if selected_decade != "Toutes les décennies":
-                decade = int(selected_decade[:-1])
-                person_decades_df = person_decades_df[person_decades_df['decade'] == decade]
-            
-            # Compter les apparitions pour la décennie sélectionnée
-            df_top_person = pd.DataFrame(person_decades_df['person'].value_counts().head(10))
-            df_top_person.reset_index(inplace=True)
-            df_top_person.columns = ['nconst', 'nb_films']
+            # Les 10 personnes les plus présentes, lues dans la table des apparitions précalculée
+            decade = None if selected_decade == "Toutes les décennies" else int(selected_decade[:-1])
+            df_top_person = agregats.top_personnes(column_name, decade, k=10)
             
             # Joindre avec les informations des personnes
             df_person_film = pd.merge(
@@ -365,39 +341,43 @@ with col2:
             df_person_film = df_person_film.sort_values(by='nb_films', ascending=False)
             
             # Création du graphique
-            fig, ax = plt.subplots(figsize=(12, 6))
-            
-            # Créer un graphique à barres horizontales avec les données triées
-            sns.barplot(
-                y=df_person_film['primaryName'],
-                x=df_person_film['nb_films'],
-                palette="viridis",
-                ax=ax,
-                order=df_person_film['primaryName']
-            )
+            decade_text = "toutes décennies confondues" if selected_decade == "Toutes les décennies" else f"dans les années {selected_decade}"
+            cle = cle_figure(acteurs_submenu, st.session_state.gender_choice)
+            image = cache_figures.cache.obtenir(cle)
+            if image is None:
+                fig, ax = plt.subplots(figsize=(12, 6))
             
-            # Ajouter les valeurs sur les barres
-            for p in ax.patches:
-                ax.annotate(
-                    format(p.get_width(), '.0f'),
-                    (p.get_width(), p.get_y() + p.get_height() / 2),
-                    ha='left', va='center',
-                    xytext=(5, 0),
-                    textcoords='offset points',
-                    fontsize=10
+                # Créer un graphique à barres horizontales avec les données triées
+                sns.barplot(
+                    y=df_person_film['primaryName'],
+                    x=df_person_film['nb_films'],
+                    palette="viridis",
+                    ax=ax,
+                    order=df_person_film['primaryName']
                 )
             
-            # Personnalisation du graphique
-            decade_text = "toutes décennies confondues" if selected_decade == "Toutes les décennies" else f"dans les années {selected_decade}"
-            plt.title(f"Les 10 {st.session_state.gender_choice.lower()} les plus présent(e)s au cinéma {decade_text}", fontsize=16)
-            plt.xlabel("Nombre de films", fontsize=14)
-            plt.ylabel(st.session_state.gender_choice, fontsize=14)
+                # Ajouter les valeurs sur les barres
+                for p in ax.patches:
+                    ax.annotate(
+                        format(p.get_width(), '.0f'),
+                        (p.get_width(), p.get_y() + p.get_height() / 2),
+                        ha='left', va='center',
+                        xytext=(5, 0),
+                        textcoords='offset points',
+                        fontsize=10
+                    )
             
-            # Ajuster les marges
-            plt.tight_layout()
+                # Personnalisation du graphique
+                plt.title(f"Les 10 {st.session_state.gender_choice.lower()} les plus présent(e)s au cinéma {decade_text}", fontsize=16)
+                plt.xlabel("Nombre de films", fontsize=14)
+                plt.ylabel(st.session_state.gender_choice, fontsize=14)
+            
+                # Ajuster les marges
+                plt.tight_layout()
+                image = cache_figures.cache.ajouter(cle, fig)
             
             # Afficher le graphique
-            st.pyplot(fig)
+            st.image(image, width="stretch")
             
             # Afficher les détails (triés par nombre de films décroissant)
             st.subheader(f"Détails des {st.session_state.gender_choice.lower()} {decade_text}")
@@ -419,15 +399,10 @@ with col2:
             st.header("Films français les mieux notés par décennie")
             
             # Chargement des données
-            url = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-            df = pd.read_csv(url, sep='\t')
-            
-            # Filtrer les films français
-            df_fr = df[df['original_language'] == 'fr']
+            df = charger_donnees("tconst", ['year', 'decade', 'title', 'original_language', 'vote', 'rate'])
             
-            # Convertir l'année en format datetime et filtrer depuis 1960
-            df_fr['decade'] = (pd.to_datetime(df_fr['year'].astype(str), format='%Y').dt.year // 10) * 10
-            df_fr = df_fr[df_fr['decade'] >= 1960]
+            # Filtrer les films français depuis 1960 (décennie précalculée dans le snapshot)
+            df_fr = df[(df['original_language'] == 'fr') & (df['decade'] >= 1960)]
             
             # Filtrer les films avec au moins 1000 votes
             df_fr = df_fr[df_fr['vote'] >= 1000]
@@ -436,57 +411,61 @@ with col2:
             df_fr = filter_by_decade(df_fr, selected_decade)
             
             if len(df_fr) > 0:
-                # Création de la figure
-                fig, ax = plt.subplots(figsize=(15, 10))
-                
                 # Recherche du meilleur film de chaque décennie
+                cle_cache = (ingestion.version("tconst"), origine_submenu, selected_decade)
                 if selected_decade == "Toutes les décennies":
-                    top_by_decade = df_fr.groupby('decade').apply(
-                        lambda x: x.nlargest(1, 'rate')).reset_index(drop=True)
+                    top_by_decade = agregats.top_k_par_groupe(df_fr, 'rate', k=1, cles=['decade'], cle_cache=cle_cache)
                 else:
-                    top_by_decade = df_fr.nlargest(5, 'rate').iloc[::-1]  # Inverser l'ordre
+                    top_by_decade = agregats.top_k_par_groupe(df_fr, 'rate', k=5, cle_cache=cle_cache).iloc[::-1]  # Inverser l'ordre
                 
-                # Création du graphique à barres horizontales
-                if selected_decade == "Toutes les décennies":
-                    x_labels = top_by_decade['decade'].astype(str) + 's'
-                else:
-                    x_labels = top_by_decade['title']
+                cle = cle_figure(origine_submenu)
+                image = cache_figures.cache.obtenir(cle)
+                if image is None:
+                    # Création de la figure
+                    fig, ax = plt.subplots(figsize=(15, 10))
                 
-                bars = ax.barh(x_labels, top_by_decade['rate'])
+                    # Création du graphique à barres horizontales
+                    if selected_decade == "Toutes les décennies":
+                        x_labels = top_by_decade['decade'].astype(str) + 's'
+                    else:
+                        x_labels = top_by_decade['title']
+                
+                    bars = ax.barh(x_labels, top_by_decade['rate'])
                 
-                # Ajout du titre et de l'étiquette
-                ax.set_title('Films français les mieux notés' +
-                            (' par décennie' if selected_decade == "Toutes les décennies" else f" des années {selected_decade}"))
-                ax.set_xlabel('Note moyenne')
+                    # Ajout du titre et de l'étiquette
+                    ax.set_title('Films français les mieux notés' +
+                                (' par décennie' if selected_decade == "Toutes les décennies" else f" des années {selected_decade}"))
+                    ax.set_xlabel('Note moyenne')
                 
-                # Ajout des titres et notes
-                for bar, title, note, vote_count in zip(bars,
-                    top_by_decade['title'],
-                    top_by_decade['rate'],
-                    top_by_decade['vote']):
-                    width = bar.get_width()
+                    # Ajout des titres et notes
+                    for bar, title, note, vote_count in zip(bars,
+                        top_by_decade['title'],
+                        top_by_decade['rate'],
+                        top_by_decade['vote']):
+                        width = bar.get_width()
                     
-                    # Titre du film dans la barre
-                    ax.text(
-                        width/2,
-                        bar.get_y() + bar.get_height()/2,
-                        f'{title} ({int(vote_count)} votes)',
-                        va='center', ha='center',
-                        color='white',
-                        fontsize=12,
-                        weight='bold'
-                    )
-                    # Note après la barre
-                    ax.text(
-                        width + 0.1,
-                        bar.get_y() + bar.get_height()/2,
-                        f'{note:.1f}',
-                        va='center',
-                        fontsize=12
-                    )
+                        # Titre du film dans la barre
+                        ax.text(
+                            width/2,
+                            bar.get_y() + bar.get_height()/2,
+                            f'{title} ({int(vote_count)} votes)',
+                            va='center', ha='center',
+                            color='white',
+                            fontsize=12,
+                            weight='bold'
+                        )
+                        # Note après la barre
+                        ax.text(
+                            width + 0.1,
+                            bar.get_y() + bar.get_height()/2,
+                            f'{note:.1f}',
+                            va='center',
+                            fontsize=12
+                        )
                 
-                plt.tight_layout()
-                st.pyplot(fig)
+                    plt.tight_layout()
+                    image = cache_figures.cache.ajouter(cle, fig)
+                st.image(image, width="stretch")
                 
                 # Afficher les détails (triés par note décroissante)
                 st.subheader("Détail")
@@ -505,11 +484,7 @@ with col2:
             st.header("Films étrangers les mieux notés par décennie")
             
             # Chargement des données
-            url = "https://raw.githubusercontent.com/florianhoarau/streamlit_imdb/main/tconst.tsv.gz"
-            df = pd.read_csv(url, sep='\t')
-            
-            # Préparation des données
-            df['decade'] = (pd.to_datetime(df['year'].astype(str), format='%Y').dt.year // 10) * 10
+            df = charger_donnees("tconst", ['year', 'decade', 'title', 'original_language', 'vote', 'rate'])
             
             # Filtrer les films non français
             df = df[df['original_language'] != 'fr']
@@ -526,98 +501,111 @@ with col2:
             df_1000_10000 = filter_by_decade(df_1000_10000, selected_decade)
             df_10000plus = filter_by_decade(df_10000plus, selected_decade)
             
+            # Même sélection dans le cube agrégé, pour la répartition par langue
+            cube_etrangers = agregats.cube()
+            cube_etrangers = cube_etrangers[(cube_etrangers['original_language'] != 'fr') & (cube_etrangers['decade'] >= 1960)]
+            cube_etrangers = filter_by_decade(cube_etrangers, selected_decade)
+            
             if len(df_1000_10000) > 0 or len(df_10000plus) > 0:
                 st.subheader("Répartition des films par langue selon le nombre de votes")
                 
-                # Création de la visualisation
-                fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+                cle = cle_figure(origine_submenu, "langues")
+                image = cache_figures.cache.obtenir(cle)
+                if image is None:
+                    # Création de la visualisation
+                    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
                 
-                # Premier camembert (à gauche) - Films avec 1000-10000 votes
-                if len(df_1000_10000) > 0:
-                    countries_1000 = df_1000_10000['original_language'].value_counts().head(5)
-                    ax1.pie(countries_1000.values, labels=countries_1000.index, autopct='%1.1f%%')
-                    ax1.set_title('Répartition par langue (1000-10000 votes)')
-                else:
-                    ax1.text(0.5, 0.5, 'Pas de données disponibles', ha='center')
+                    # Premier camembert (à gauche) - Films avec 1000-10000 votes
+                    if len(df_1000_10000) > 0:
+                        countries_1000 = agregats.compter_par(cube_etrangers[cube_etrangers['tranche_vote'] == "1000-10000"], 'original_language').head(5)
+                        ax1.pie(countries_1000.values, labels=countries_1000.index, autopct='%1.1f%%')
+                        ax1.set_title('Répartition par langue (1000-10000 votes)')
+                    else:
+                        ax1.text(0.5, 0.5, 'Pas de données disponibles', ha='center')
                 
-                # Deuxième camembert (à droite) - Films avec plus de 10000 votes
-                if len(df_10000plus) > 0:
-                    countries_10000 = df_10000plus['original_language'].value_counts().head(5)
-                    ax2.pie(countries_10000.values, labels=countries_10000.index, autopct='%1.1f%%')
-                    ax2.set_title('Répartition par langue (>10000 votes)')
-                else:
-                    ax2.text(0.5, 0.5, 'Pas de données disponibles', ha='center')
+                    # Deuxième camembert (à droite) - Films avec plus de 10000 votes
+                    if len(df_10000plus) > 0:
+                        countries_10000 = agregats.compter_par(cube_etrangers[cube_etrangers['tranche_vote'] == ">10000"], 'original_language').head(5)
+                        ax2.pie(countries_10000.values, labels=countries_10000.index, autopct='%1.1f%%')
+                        ax2.set_title('Répartition par langue (>10000 votes)')
+                    else:
+                        ax2.text(0.5, 0.5, 'Pas de données disponibles', ha='center')
                 
-                plt.tight_layout()
-                st.pyplot(fig)
+                    plt.tight_layout()
+                    image = cache_figures.cache.ajouter(cle, fig)
+                st.image(image, width="stretch")
                 
                 st.subheader("Meilleurs films par décennie selon le nombre de votes")
                 
                 # Définition des groupes de votes dans l'ordre décroissant
                 vote_groups = ["Très votés (>10000)", "Moyennement votés (1000-10000)"]
                 
-                # Création de la figure avec 2 sous-graphiques
-                fig, axes = plt.subplots(len(vote_groups), 1, figsize=(15, 15))
+                cle = cle_figure(origine_submenu, "notes")
+                image = cache_figures.cache.obtenir(cle)
+                if image is None:
+                    # Création de la figure avec 2 sous-graphiques
+                    fig, axes = plt.subplots(len(vote_groups), 1, figsize=(15, 15))
                 
-                # Boucle sur chaque groupe de votes
-                for idx, group in enumerate(vote_groups):
-                    # Sélection des données selon le groupe
-                    if group == "Très votés (>10000)":
-                        group_data = df_10000plus
-                    else:
-                        group_data = df_1000_10000
-                    
-                    if len(group_data) > 0:
-                        # Recherche des meilleurs films
-                        if selected_decade == "Toutes les décennies":
-                            top_films = group_data.groupby('decade').apply(
-                                lambda x: x.nlargest(1, 'rate')).reset_index(drop=True)
+                    # Boucle sur chaque groupe de votes
+                    for idx, group in enumerate(vote_groups):
+                        # Sélection des données selon le groupe
+                        if group == "Très votés (>10000)":
+                            group_data = df_10000plus
                         else:
-                            top_films = group_data.nlargest(5, 'rate').iloc[::-1]  # Inverser l'ordre
+                            group_data = df_1000_10000
+                    
+                        if len(group_data) > 0:
+                            # Recherche des meilleurs films (calcul partagé avec la section "Détail")
+                            cle_cache = (ingestion.version("tconst"), origine_submenu, group, selected_decade)
+                            if selected_decade == "Toutes les décennies":
+                                top_films = agregats.top_k_par_groupe(group_data, 'rate', k=1, cles=['decade'], cle_cache=cle_cache)
+                            else:
+                                top_films = agregats.top_k_par_groupe(group_data, 'rate', k=5, cle_cache=cle_cache).iloc[::-1]  # Inverser l'ordre
                         
-                        # Création du graphique à barres horizontales
-                        if selected_decade == "Toutes les décennies":
-                            x_labels = top_films['decade'].astype(str) + 's'
-                        else:
-                            x_labels = top_films['title']
+                            # Création du graphique à barres horizontales
+                            if selected_decade == "Toutes les décennies":
+                                x_labels = top_films['decade'].astype(str) + 's'
+                            else:
+                                x_labels = top_films['title']
                         
-                        bars = axes[idx].barh(x_labels, top_films['rate'])
+                            bars = axes[idx].barh(x_labels, top_films['rate'])
                         
-                        # Ajout du titre et de l'étiquette
-                        axes[idx].set_title(f'Films les mieux notés - {group}')
-                        axes[idx].set_xlabel('Note moyenne')
+                            # Ajout du titre et de l'étiquette
+                            axes[idx].set_title(f'Films les mieux notés - {group}')
+                            axes[idx].set_xlabel('Note moyenne')
                         
-                        # Ajout des titres et notes
-                        for bar, title, note, vote_count in zip(bars,
-                            top_films['title'],
-                            top_films['rate'],
-                            top_films['vote']):
-                            width = bar.get_width()
+                            # Ajout des titres et notes
+                            for bar, title, note, vote_count in zip(bars,
+                                top_films['title'],
+                                top_films['rate'],
+                                top_films['vote']):
+                                width = bar.get_width()
                             
-                            # Titre du film dans la barre
-                            axes[idx].text(
-                                width/2,
-                                bar.get_y() + bar.get_height()/2,
-                                f'{title} ({int(vote_count)} votes)',
-                                va='center', ha='center',
-                                color='white',
-                                fontsize=12,
-                                weight='bold'
-                            )
-                            # Note après la barre
-                            axes[idx].text(
-                                width + 0.1,
-                                bar.get_y() + bar.get_height()/2,
-                                f'{note:.1f}',
-                                va='center',
-                                fontsize=12
-                            )
-                    else:
-                        axes[idx].text(0.5, 0.5, 'Pas de données disponibles pour cette période',
-                                    ha='center', va='center')
+                                # Titre du film dans la barre
+                                axes[idx].text(
+                                    width/2,
+                                    bar.get_y() + bar.get_height()/2,
+                                    f'{title} ({int(vote_count)} votes)',
+                                    va='center', ha='center',
+                                    color='white',
+                                    fontsize=12,
+                                    weight='bold'
+                                )
+                                # Note après la barre
+                                axes[idx].text(
+                                    width + 0.1,
+                                    bar.get_y() + bar.get_height()/2,
+                                    f'{note:.1f}',
+                                    va='center',
+                                    fontsize=12
+                                )
+                        else:
+                            axes[idx].text(0.5, 0.5, 'Pas de données disponibles pour cette période',
+                                        ha='center', va='center')
                 
-                plt.tight_layout()
-                st.pyplot(fig)
+                    plt.tight_layout()
+                    image = cache_figures.cache.ajouter(cle, fig)
+                st.image(image, width="stretch")
                 
                 # Afficher les détails (triés par note décroissante)
                 st.subheader("Détail")
@@ -629,11 +617,11 @@ with col2:
                     
                     if len(group_data) > 0:
                         st.write(f"\n### {group}")
+                        cle_cache = (ingestion.version("tconst"), origine_submenu, group, selected_decade)
                         if selected_decade == "Toutes les décennies":
-                            top_films = group_data.groupby('decade').apply(
-                                lambda x: x.nlargest(1, 'rate')).reset_index(drop=True)
+                            top_films = agregats.top_k_par_groupe(group_data, 'rate', k=1, cles=['decade'], cle_cache=cle_cache)
                         else:
-                            top_films = group_data.nlargest(5, 'rate')
+                            top_films = agregats.top_k_par_groupe(group_data, 'rate', k=5, cle_cache=cle_cache)
                         
                         # Trier les films par note décroissante
                         sorted_films = top_films.sort_values('rate', ascending=False)
@@ -0,0 +1,76 @@
+# bibliothèques
+import numpy as np
+import seaborn as sns
+
+import ingestion
+import registre
+
+# Parts de chaque tranche (budget, durée) par année, calculées une fois sur une grille fixe.
+# Même estimation que sns.kdeplot(multiple="fill", common_norm=True) : noyau gaussien,
+# largeur de bande de Scott, grille commune de 200 points étendue de 3 largeurs de bande.
+TAILLE_GRILLE = 200
+COUPURE = 3
+
+
+def _largeur_scott(x):
+    return len(x) ** (-1 / 5) * np.std(x, ddof=1)
+
+
+def parts_par_annee(annees, tranches, ordre):
+    # Renvoie (grille, parts) avec parts[i] la part de la tranche ordre[i] en chaque point de la grille
+    annees = np.asarray(annees, dtype=np.float64)
+    tranches = np.asarray(tranches)
+    bw = _largeur_scott(annees)
+    grille = np.linspace(annees.min() - COUPURE * bw, annees.max() + COUPURE * bw, TAILLE_GRILLE)
+
+    densites = np.zeros((len(ordre), TAILLE_GRILLE))
+    for i, tranche in enumerate(ordre):
+        x = annees[tranches == tranche]
+        bw_tranche = _largeur_scott(x) if len(x) > 1 else 0
+        if not bw_tranche > 0:
+            continue  # tranche vide ou constante : seaborn ne la trace pas non plus
+        # Les années sont discrètes : on somme un noyau par année distincte, pondéré par son effectif
+        valeurs, effectifs = np.unique(x, return_counts=True)
+        z = (grille[:, None] - valeurs[None, :]) / bw_tranche
+        noyaux = np.exp(-0.5 * z ** 2) / (bw_tranche * np.sqrt(2 * np.pi))
+        densites[i] = noyaux @ effectifs / len(annees)  # normalisation commune (common_norm)
+
+    total = densites.sum(axis=0)
+    parts = np.divide(densites, total, out=np.zeros_like(densites), where=total > 0)
+    return grille, parts
+
+
+def tracer_parts(ax, grille, parts, etiquettes, palette="tab10_r", alpha=.5):
+    # Aires empilées : la première tranche en haut, comme seaborn avec multiple="fill"
+    couleurs = sns.color_palette(palette, len(etiquettes))
+    ax.stackplot(grille, parts[::-1], labels=etiquettes[::-1], colors=couleurs[::-1],
+                 alpha=alpha, linewidth=0)
+    ax.set_ylim(0, 1)
+
+
+# Tranches utilisées par les onglets Budget et Durée
+def _densite_budget():
+    df = ingestion.charger_snapshot("tconst", colonnes=["year", "budget"])
+    df = df[df["budget"] > 0]
+    longueurs = df["budget"].astype(str).str.len()  # même découpage que 10**len(str(x))
+    ordre = sorted(longueurs.unique(), reverse=True)
+    grille, parts = parts_par_annee(df["year"], longueurs, ordre)
+    return grille, parts, ["<1" + "0" * int(n) for n in ordre]
+
+
+def _densite_duree():
+    df = ingestion.charger_snapshot("tconst", colonnes=["year", "runtimeMinutes"])
+    bornes = ((1 + df["runtimeMinutes"] // 30) * 30).astype(int)
+    ordre = sorted(bornes.unique(), reverse=True)
+    grille, parts = parts_par_annee(df["year"], bornes, ordre)
+    return grille, parts, ["<" + str(b) for b in ordre]
+
+
+def densite(nom):
+    # (grille, parts, étiquettes) pour "budget" ou "duree", triées de la plus grande tranche à la plus petite
+    with registre.acquerir(f"densite_{nom}") as poignee:
+        return poignee.valeur
+
+
+registre.enregistrer("densite_budget", _densite_budget, version=lambda: ingestion.version("tconst"))
+registre.enregistrer("densite_duree", _densite_duree, version=lambda: ingestion.version("tconst"))
@@ -0,0 +1,228 @@
+# bibliothèques
+import json
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import chargement
+import registre
+
+# Version du format des snapshots (à incrémenter si le schéma change)
+VERSION_SNAPSHOT = 2
+
+# Schéma explicite des colonnes :
+# - "texte" : octets UTF-8 de toutes les valeurs mis bout à bout et bornes de chaque valeur (comme listes.py),
+#   avec un masque des valeurs manquantes ; décodées seulement à la lecture, et seulement les lignes demandées
+# - "categorie" : codes entiers + liste des modalités
+# - autre : type numpy
+SCHEMAS = {
+    "tconst": {
+        "tconst": "texte",
+        "year": "int16",
+        "runtimeMinutes": "float32",
+        "title": "texte",
+        "director": "texte",
+        "writer": "texte",
+        "budget": "float64",
+        "id": "int32",
+        "original_language": "categorie",
+        "production_countries": "texte",
+        "revenue": "float64",
+        "spoken_languages": "texte",
+        "genres": "texte",
+        "vote": "int32",
+        "rate": "float32",
+        "rank": "float32",
+        "actor": "texte",
+        "actress": "texte",
+    },
+    "nconst": {
+        "nconst": "texte",
+        "primaryName": "texte",
+        "birthYear": "float32",
+        "deathYear": "float32",
+        "primaryProfession": "texte",
+        "knownForTitles": "texte",
+    },
+}
+
+_verrou = threading.Lock()
+
+
+# Écriture / lecture d'un dossier de tableaux numpy
+def sauver_tableaux(dossier, tableaux, meta=None):
+    # Écrit chaque tableau dans un .npy, dans un dossier temporaire renommé à la fin (écriture atomique)
+    parent = os.path.dirname(dossier)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        for nom, tableau in tableaux.items():
+            np.save(os.path.join(tmp, f"{nom}.npy"), np.ascontiguousarray(tableau), allow_pickle=False)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta or {}, f, indent=2)
+        try:
+            os.rename(tmp, dossier)
+        except OSError:
+            # Un autre processus a déjà écrit le même dossier
+            if not os.path.exists(os.path.join(dossier, "meta.json")):
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def lire_meta(dossier):
+    with open(os.path.join(dossier, "meta.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def charger_tableau(dossier, nom, mmap=True):
+    return np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r" if mmap else None)
+
+
+# Textes : la valeur i est octets[bornes[i]:bornes[i + 1]] décodé en UTF-8
+def encoder_textes(valeurs):
+    encodees = [str(v).encode("utf-8") for v in valeurs]
+    bornes = np.zeros(len(encodees) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encodees], out=bornes[1:])
+    return np.frombuffer(b"".join(encodees), dtype=np.uint8), bornes
+
+
+def decoder_textes(octets, bornes, lignes=None):
+    # Tableau object des valeurs (toutes, ou seulement les lignes demandées)
+    if lignes is not None:
+        return np.array([bytes(octets[bornes[i]:bornes[i + 1]]).decode("utf-8") for i in np.asarray(lignes).tolist()],
+                        dtype=object)
+    texte = bytes(octets).decode("utf-8")
+    if len(texte) == len(octets):
+        caracteres = np.asarray(bornes)
+    else:
+        # Bornes en caractères : nombre d'octets qui commencent un caractère (hors octets de continuation)
+        debuts = np.zeros(len(octets) + 1, dtype=np.int64)
+        np.cumsum((np.asarray(octets) & 0xC0) != 0x80, out=debuts[1:])
+        caracteres = debuts[bornes]
+    valeurs = np.empty(len(bornes) - 1, dtype=object)
+    valeurs[:] = [texte[a:b] for a, b in zip(caracteres[:-1].tolist(), caracteres[1:].tolist())]
+    return valeurs
+
+
+# Conversion des colonnes
+def _convertir(nom_colonne, serie, type_colonne):
+    # Renvoie (tableaux à écrire, type effectif, infos supplémentaires)
+    if type_colonne == "texte":
+        manquant = serie.isna().to_numpy()
+        octets, bornes = encoder_textes(serie.astype(object).where(~manquant, "").to_numpy())
+        tableaux = {nom_colonne: octets, f"{nom_colonne}.bornes": bornes}
+        if manquant.any():
+            tableaux[f"{nom_colonne}.na"] = manquant
+        return tableaux, "texte", {}
+
+    if type_colonne == "categorie":
+        cat = serie.astype("category")
+        codes = cat.cat.codes.to_numpy()
+        type_codes = np.int16 if len(cat.cat.categories) < np.iinfo(np.int16).max else np.int32
+        return ({nom_colonne: codes.astype(type_codes)}, "categorie",
+                {"modalites": [str(m) for m in cat.cat.categories]})
+
+    valeurs = pd.to_numeric(serie, errors="raise")
+    dtype = np.dtype(type_colonne)
+    if dtype.kind in "iu" and valeurs.isna().any():
+        # Une colonne entière avec des manquants est gardée en flottant plutôt que de perdre les NaN
+        warnings.warn(f"Colonne {nom_colonne!r} : valeurs manquantes, stockée en float64 au lieu de {dtype}")
+        dtype = np.dtype("float64")
+    return {nom_colonne: valeurs.to_numpy(dtype=dtype)}, str(dtype), {}
+
+
+def _dossier_snapshot(nom):
+    return os.path.join(chargement.DOSSIER_CACHE, "snapshots", version(nom))
+
+
+def construire_snapshot(nom):
+    # Lit le TSV une seule fois et écrit le snapshot typé (une colonne par fichier .npy)
+    dossier = _dossier_snapshot(nom)
+    if os.path.exists(os.path.join(dossier, "meta.json")):
+        return dossier
+
+    with _verrou:
+        if os.path.exists(os.path.join(dossier, "meta.json")):
+            return dossier
+
+        schema = SCHEMAS[nom]
+        types_lecture = {c: str for c, t in schema.items() if t in ("texte", "categorie")}
+        df = chargement.charger_tsv(nom, low_memory=False, na_values=['\\N'], dtype=types_lecture)
+
+        # Colonne dérivée utilisée par tous les onglets
+        if nom == "tconst":
+            df["decade"] = (df["year"] // 10) * 10
+
+        tableaux, colonnes = {}, {}
+        for colonne in df.columns:
+            type_colonne = schema.get(colonne)
+            if type_colonne is None:
+                # Colonne absente du schéma : int16 pour la décennie, sinon numérique ou texte
+                if colonne == "decade":
+                    type_colonne = "int16"
+                elif pd.api.types.is_numeric_dtype(df[colonne]):
+                    type_colonne = "float64"
+                else:
+                    type_colonne = "texte"
+            t, type_effectif, infos = _convertir(colonne, df[colonne], type_colonne)
+            tableaux.update(t)
+            colonnes[colonne] = {"type": type_effectif, **infos}
+
+        meta = {
+            "nom": nom,
+            "version": VERSION_SNAPSHOT,
+            "empreinte": chargement.empreinte(nom),
+            "lignes": len(df),
+            "colonnes": colonnes,
+        }
+        sauver_tableaux(dossier, tableaux, meta)
+        return dossier
+
+
+def charger_snapshot(nom, colonnes=None, lignes=None):
+    # Charge le snapshot en mémoire partagée (mmap) ; seules les colonnes demandées sont lues.
+    # lignes : positions des seules lignes à lire (les textes des autres lignes ne sont pas décodés),
+    # qui deviennent l'index du résultat
+    dossier = construire_snapshot(nom)
+    meta = lire_meta(dossier)
+    if colonnes is None:
+        colonnes = list(meta["colonnes"])
+    inconnues = [c for c in colonnes if c not in meta["colonnes"]]
+    if inconnues:
+        raise KeyError(f"Colonnes absentes du snapshot {nom} : {inconnues}")
+
+    donnees = {}
+    for colonne in colonnes:
+        infos = meta["colonnes"][colonne]
+        valeurs = charger_tableau(dossier, colonne)
+        if infos["type"] == "texte":
+            valeurs = decoder_textes(valeurs, charger_tableau(dossier, f"{colonne}.bornes"), lignes)
+            chemin_na = os.path.join(dossier, f"{colonne}.na.npy")
+            if os.path.exists(chemin_na):
+                manquant = np.load(chemin_na, mmap_mode="r")
+                valeurs[manquant if lignes is None else manquant[lignes]] = np.nan
+        else:
+            if lignes is not None:
+                valeurs = valeurs[lignes]
+            if infos["type"] == "categorie":
+                valeurs = pd.Categorical.from_codes(valeurs, categories=infos["modalites"])
+        donnees[colonne] = valeurs
+    return pd.DataFrame(donnees, index=None if lignes is None else np.asarray(lignes), copy=False)
+
+
+def version(nom):
+    # Version du jeu de données : empreinte du fichier source et version du format
+    return f"{nom}-v{VERSION_SNAPSHOT}-{chargement.empreinte(nom)[:16]}"
+
+
+# Les snapshots complets sont partagés par toutes les sessions via le registre du processus
+for _nom in SCHEMAS:
+    registre.enregistrer(_nom, lambda nom=_nom: charger_snapshot(nom), version=lambda nom=_nom: version(nom))
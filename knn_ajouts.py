@@ -0,0 +1,118 @@
+# bibliothèques
+import threading
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.preprocessing import MinMaxScaler
+
+import KNN
+from knn_features import MatriceFeatures
+from listes import analyser_listes
+
+# Ajout de films au modèle chargé sans tout reconstruire : les nouveaux films sont normalisés avec le
+# scaler existant puis ajoutés à la matrice des features et aux index déjà construits.
+# Si leurs valeurs sortent trop des bornes du scaler (dérive), le modèle est reconstruit en arrière-plan.
+# Les ajouts restent en mémoire : l'artefact sur disque correspond toujours au jeu de données téléchargé.
+
+# Dérive tolérée : dépassement maximal des valeurs normalisées hors de [0, 1]
+SEUIL_DERIVE = 0.1
+
+_verrou = threading.Lock()
+_reconstructions = {}  # id du modèle -> thread de reconstruction en cours
+
+
+def ajouter_films(films, seuil_derive=SEUIL_DERIVE):
+    # films : DataFrame avec au moins tconst, genres et les colonnes numériques du modèle.
+    # Renvoie un résumé de l'ajout (nombre de films, genres inconnus jusque-là, dérive, reconstruction lancée).
+    manquantes = [c for c in ['tconst', 'genres'] + KNN.numeric_features if c not in films.columns]
+    if manquantes:
+        raise ValueError(f"Colonnes manquantes : {manquantes}")
+
+    with _verrou:
+        modele = KNN.obtenir_modele()
+        df_movies = modele.df_movies
+        deja_presents = np.intersect1d(films['tconst'].to_numpy().astype(str), modele.tconst)
+        if len(deja_presents):
+            raise ValueError(f"Films déjà présents : {deja_presents[:10].tolist()}")
+
+        # Même préparation que preparer_films
+        films = films.reset_index(drop=True)
+        films['genres'] = films['genres'].fillna('Sans catégorie')
+        genres = analyser_listes(films['genres'])
+        films['genres'] = genres.listes()
+        films['budget'] = films['budget'].fillna(df_movies['budget'].mean())
+
+        # Normalisation avec le scaler existant et mesure de la dérive
+        numeriques = modele.scaler.transform(films[KNN.numeric_features].astype('float64').fillna(0).to_numpy())
+        derive = float(max(0, (-numeriques).max(initial=0), (numeriques - 1).max(initial=0)))
+
+        # Les genres inconnus deviennent de nouvelles colonnes (à 0 pour les films existants)
+        valeurs = genres.valeurs.astype(str).tolist()
+        genres_inconnus = sorted(set(valeurs) - set(modele.genre_columns))
+        genre_columns = modele.genre_columns + genres_inconnus
+        codes = pd.Index(genre_columns).get_indexer(valeurs)
+        genres_creux = sp.csr_matrix((np.ones(len(codes), dtype=np.float32), (genres.lignes(), codes)),
+                                     shape=(len(films), len(genre_columns)))
+
+        # Index étendus construits à côté des index actuels, qui restent cherchés pendant ce temps, puis
+        # remplacés d'un coup avec les films (un index construit entre-temps sur l'ancien X est abandonné)
+        X = modele.X.empiler(MatriceFeatures(numeriques, genres_creux))
+        with modele._verrou:
+            index_actuels = dict(modele._index)
+        index_etendus = {cle: index.ajouter(X) for cle, index in index_actuels.items()}
+        with modele._verrou:
+            modele.X = X
+            modele.feature_columns = KNN.numeric_features + genre_columns
+            modele.genre_columns = genre_columns
+            modele.tconst = np.concatenate([modele.tconst, films['tconst'].to_numpy().astype(str)])
+            modele._df_movies = pd.concat([df_movies, films], ignore_index=True)
+            modele._model = None
+            modele._index = index_etendus
+            modele.derive = max(modele.derive, derive)
+            modele.revision += 1
+
+        reconstruction = modele.derive > seuil_derive
+        if reconstruction:
+            _lancer_reconstruction(modele)
+
+    return {"ajoutes": len(films), "genres_inconnus": genres_inconnus,
+            "derive": modele.derive, "reconstruction": reconstruction}
+
+
+def reconstruire(modele):
+    # Nouveau modèle avec un scaler réappris sur tous les films, y compris ceux ajoutés
+    df_movies = modele.df_movies
+    scaler = MinMaxScaler()
+    numeriques = scaler.fit_transform(df_movies[KNN.numeric_features].astype('float64').fillna(0).to_numpy())
+    nouveau = KNN.ModeleKNN(scaler, MatriceFeatures(numeriques, modele.X.genres), modele.feature_columns,
+                            modele.tconst, modele.version, df_movies)
+    nouveau.revision = modele.revision + 1
+    return nouveau
+
+
+def _lancer_reconstruction(modele):
+    # Une seule reconstruction à la fois par modèle ; les ajouts attendent la fin de la reconstruction
+    if id(modele) in _reconstructions:
+        return _reconstructions[id(modele)]
+
+    def executer():
+        try:
+            with _verrou:
+                nouveau = reconstruire(modele)
+                with KNN._verrou:
+                    if KNN._modele is modele:
+                        KNN._modele = nouveau
+        finally:
+            _reconstructions.pop(id(modele), None)
+
+    thread = threading.Thread(target=executer, name="reconstruction-knn", daemon=True)
+    _reconstructions[id(modele)] = thread
+    thread.start()
+    return thread
+
+
+def attendre_reconstruction():
+    # Attend la fin des reconstructions en cours (utile pour les scripts et les tests)
+    for thread in list(_reconstructions.values()):
+        thread.join()
@@ -0,0 +1,115 @@
+# bibliothèques
+import copy
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+import knn_index
+
+# Index compressé : les features sont réduites (ACP ou projection aléatoire) puis quantifiées sur 8 bits par
+# dimension. La recherche parcourt ces codes int8 pour obtenir une liste courte de candidats, reclassés ensuite
+# avec les distances exactes (seules les lignes de la liste courte sont lues dans la matrice complète).
+VARIANCE_GARDEE = 0.95  # ACP : nombre de dimensions choisi pour garder cette part de la variance
+FACTEUR_LISTE = 10  # taille de la liste courte : FACTEUR_LISTE * k
+LIGNES_BLOC = 65536  # codes décodés à la fois
+
+
+class IndexCompresse:
+    nom = "compresse"
+
+    def __init__(self, methode="pca", dimension=None, facteur_liste=FACTEUR_LISTE, taille_echantillon=100_000, graine=0):
+        if methode not in ("pca", "projection"):
+            raise ValueError(f"Méthode de réduction inconnue : {methode!r} (attendu : 'pca' ou 'projection')")
+        self.methode = methode
+        self.dimension = dimension
+        self.facteur_liste = facteur_liste
+        self.taille_echantillon = taille_echantillon
+        self.graine = graine
+
+    def ajuster(self, X):
+        self.X = X
+        rng = np.random.default_rng(self.graine)
+        n, n_features = X.shape
+        echantillon = X if n <= self.taille_echantillon else X[np.sort(rng.choice(n, self.taille_echantillon, replace=False))]
+        echantillon = echantillon.toarray().astype(np.float64)
+
+        # Réduction : z = (x - centre) @ base
+        if self.methode == "pca":
+            pca = PCA(n_components=self.dimension or VARIANCE_GARDEE, random_state=self.graine).fit(echantillon)
+            self.centre, self.base = pca.mean_, pca.components_.T
+        else:
+            dimension = self.dimension or max(1, n_features // 2)
+            self.centre = np.zeros(n_features)
+            self.base = rng.normal(0, 1 / np.sqrt(dimension), (n_features, dimension))
+
+        # Quantification par dimension, bornes prises sur l'échantillon : z ≈ decalage + pas * (code + 128)
+        z = self._reduire(echantillon)
+        self.decalage = z.min(axis=0)
+        self.pas = np.maximum(z.max(axis=0) - self.decalage, 1e-12) / 255
+        self.codes = np.concatenate([self._quantifier(self._reduire(X[debut:debut + LIGNES_BLOC].toarray()))
+                                     for debut in range(0, n, LIGNES_BLOC)])
+        # |z|² de chaque ligne dans l'espace des codes pondéré par pas² (voir chercher)
+        self.normes = np.concatenate([(self._decoder_poids(self.codes[debut:debut + LIGNES_BLOC]) ** 2
+                                       * self.pas ** 2).sum(axis=1)
+                                      for debut in range(0, n, LIGNES_BLOC)]).astype(np.float32)
+        return self
+
+    def ajouter(self, X):
+        # Nouvel index : self n'est pas modifié (codes et normes restent cohérents pour les recherches en cours)
+        nouveau = copy.copy(self)
+        nouvelles = X[len(self.codes):]
+        codes = self._quantifier(self._reduire(nouvelles.toarray()))
+        nouveau.codes = np.concatenate([self.codes, codes])
+        nouveau.normes = np.concatenate([self.normes, ((self._decoder_poids(codes) ** 2) * self.pas ** 2).sum(axis=1)
+                                         .astype(np.float32)])
+        nouveau.X = X
+        return nouveau
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.normes.nbytes
+
+    def _reduire(self, denses):
+        # Les genres ajoutés après l'ajustement (knn_ajouts) n'ont pas de dimension réduite : seul le reclassement exact
+        # en tient compte
+        denses = np.asarray(denses, dtype=np.float64)[:, :len(self.centre)]
+        return (denses - self.centre) @ self.base
+
+    def _quantifier(self, z):
+        codes = np.rint((z - self.decalage) / self.pas) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    @staticmethod
+    def _decoder_poids(codes):
+        # Code ramené à [0, 255] en float32 : z = decalage + pas * c
+        return codes.astype(np.float32) + 128
+
+    def chercher(self, requetes, k):
+        # Distance approchée : |zq - z|² = Σ pas² (u - c)² avec u = (zq - decalage) / pas, développée en
+        # |u|²_pas - 2 (pas² u) . c + |c|²_pas pour n'avoir qu'un produit matriciel par bloc de codes
+        u = ((self._reduire(requetes.toarray()) - self.decalage) / self.pas).astype(np.float32)
+        poids = (u * self.pas ** 2).astype(np.float32)
+        n = len(self.codes)
+        k = min(k, n)
+        liste = min(n, k * self.facteur_liste)
+
+        bloc = max(1, knn_index.TAILLE_BLOC // n)
+        distances = np.empty((len(requetes), k))
+        indices = np.empty((len(requetes), k), dtype=np.int64)
+        for debut in range(0, len(requetes), bloc):
+            fin = min(debut + bloc, len(requetes))
+            d = np.empty((fin - debut, n), dtype=np.float32)
+            for ligne in range(0, n, LIGNES_BLOC):
+                c = self._decoder_poids(self.codes[ligne:ligne + LIGNES_BLOC])
+                d[:, ligne:ligne + LIGNES_BLOC] = self.normes[None, ligne:ligne + LIGNES_BLOC] - 2 * poids[debut:fin] @ c.T
+            _, candidats = knn_index.plus_proches(d, liste, racine=False)
+
+            # Reclassement exact des listes courtes (triées pour départager les ex aequo par indice)
+            candidats.sort(axis=1)
+            distances[debut:fin], meilleurs = knn_index.plus_proches(
+                self.X.distances_par_requete(requetes[debut:fin], candidats), k)
+            indices[debut:fin] = np.take_along_axis(candidats, meilleurs, axis=1)
+        return distances, indices
+
+
+knn_index.BACKENDS[IndexCompresse.nom] = IndexCompresse
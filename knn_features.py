@@ -0,0 +1,99 @@
+# bibliothèques
+import numpy as np
+import scipy.sparse as sp
+
+# Features du recommandeur : un bloc dense float32 pour les colonnes numériques et un bloc creux (CSR)
+# pour les genres, qui valent presque tous 0. Les distances sont calculées bloc par bloc sans jamais
+# construire la matrice dense complète.
+
+
+class MatriceFeatures:
+    # Les tableaux déjà au bon format (par exemple ouverts en mmap) sont gardés tels quels, sans copie
+    def __init__(self, numeriques, genres, normes_genres=None):
+        numeriques = np.asarray(numeriques, dtype=np.float32)
+        if numeriques.strides[0] != numeriques.itemsize:
+            numeriques = np.asfortranarray(numeriques)  # valeurs de chaque colonne contiguës
+        self.numeriques = numeriques
+        self.genres = genres if sp.isspmatrix_csr(genres) and genres.dtype == np.float32 \
+            else sp.csr_matrix(genres, dtype=np.float32)
+        if self.numeriques.shape[0] != self.genres.shape[0]:
+            raise ValueError("Les blocs numérique et genres n'ont pas le même nombre de lignes")
+        if normes_genres is None:
+            normes_genres = np.asarray(self.genres.multiply(self.genres).sum(axis=1), dtype=np.float32).ravel()
+        self.normes_genres = normes_genres
+
+    @classmethod
+    def depuis_dense(cls, X, n_numeriques):
+        X = np.asarray(X)
+        return cls(X[:, :n_numeriques], sp.csr_matrix(X[:, n_numeriques:]))
+
+    def __len__(self):
+        return self.numeriques.shape[0]
+
+    def __getitem__(self, lignes):
+        # Sous-ensemble de lignes (tranche, tableau d'indices ou masque) ; une tranche simple est une vue, sans copie
+        if isinstance(lignes, slice) and lignes.step in (None, 1):
+            debut, fin, _ = lignes.indices(len(self))
+            fin = max(debut, fin)
+            bornes = self.genres.indptr[debut:fin + 1]
+            genres = sp.csr_matrix((self.genres.data[bornes[0]:bornes[-1]], self.genres.indices[bornes[0]:bornes[-1]],
+                                    bornes - bornes[0]), shape=(fin - debut, self.genres.shape[1]), copy=False)
+            return MatriceFeatures(self.numeriques[debut:fin], genres, self.normes_genres[debut:fin])
+        return MatriceFeatures(self.numeriques[lignes], self.genres[lignes])
+
+    @property
+    def shape(self):
+        return (len(self), self.numeriques.shape[1] + self.genres.shape[1])
+
+    @property
+    def nbytes(self):
+        return (self.numeriques.nbytes + self.genres.data.nbytes + self.genres.indices.nbytes
+                + self.genres.indptr.nbytes + self.normes_genres.nbytes)
+
+    def empiler(self, autre):
+        # Nouvelle matrice avec les lignes d'autre à la suite (le bloc genres est élargi au plus grand des deux)
+        n_genres = max(self.genres.shape[1], autre.genres.shape[1])
+        genres = sp.vstack([_elargir(self.genres, n_genres), _elargir(autre.genres, n_genres)], format="csr")
+        return MatriceFeatures(np.vstack([self.numeriques, autre.numeriques]), genres)
+
+    def toarray(self):
+        return np.hstack([self.numeriques, self.genres.toarray()])
+
+    def tocsr(self):
+        return sp.hstack([sp.csr_matrix(self.numeriques), self.genres], format="csr")
+
+    def distances_carrees(self, requetes, lignes=None):
+        # Distances euclidiennes au carré (une ligne par requête, une colonne par film, ou par film de lignes).
+        # Partie numérique : différences colonne par colonne (précis en float32).
+        # Partie genres : |q|² + |x|² - 2 q.x, le produit ne parcourant que les genres non nuls des films.
+        numeriques, genres, normes_genres = self.numeriques, self.genres, self.normes_genres
+        if lignes is not None:
+            numeriques, genres, normes_genres = numeriques[lignes], genres[lignes], normes_genres[lignes]
+
+        d = np.zeros((len(requetes), len(numeriques)), dtype=np.float32)
+        ecart = np.empty_like(d)
+        for j in range(numeriques.shape[1]):
+            np.subtract(numeriques[None, :, j], requetes.numeriques[:, j, None], out=ecart)
+            ecart *= ecart
+            d += ecart
+        d += requetes.normes_genres[:, None]
+        d += normes_genres[None, :]
+        d -= 2 * (genres @ requetes.genres.T.toarray()).T
+        return np.maximum(d, 0, out=d)
+
+    def distances_par_requete(self, requetes, lignes):
+        # Distances au carré de chaque requête i aux seuls films lignes[i] (tableau requêtes x candidats)
+        n_requetes, n_candidats = lignes.shape
+        plat = lignes.ravel()
+        ecarts = self.numeriques[plat].reshape(n_requetes, n_candidats, -1) - requetes.numeriques[:, None, :]
+        d = np.einsum('ijk,ijk->ij', ecarts, ecarts)
+        d += requetes.normes_genres[:, None] + self.normes_genres[lignes]
+        produits = self.genres[plat].multiply(requetes.genres[np.repeat(np.arange(n_requetes), n_candidats)])
+        d -= 2 * np.asarray(produits.sum(axis=1)).reshape(n_requetes, n_candidats)
+        return np.maximum(d, 0, out=d)
+
+
+def _elargir(matrice, n_colonnes):
+    matrice = matrice.copy()
+    matrice.resize((matrice.shape[0], n_colonnes))
+    return matrice
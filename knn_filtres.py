@@ -0,0 +1,142 @@
+# bibliothèques
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from knn_index import plus_proches, TAILLE_BLOC
+
+# Filtres appliqués pendant la recherche des voisins (et non après) : les films sont répartis à l'avance
+# par décennie, langue originale, genre et nombre de votes ; un filtre donne directement la liste triée
+# des films candidats et seuls ceux-ci sont comparés à la requête. Le top-k est donc exact sous le filtre.
+FILTRES = ("decennie", "langue", "vote_min", "genre")
+
+
+class Partitions:
+    def __init__(self, modele):
+        df = modele.colonnes(['year', 'original_language', 'vote'])
+        self.n = len(df)
+        self.decennies = _partitionner((df['year'].to_numpy() // 10) * 10)
+        self.langues = _partitionner(df['original_language'].astype(object).fillna('').to_numpy().astype(str))
+
+        # Votes : films triés par nombre de votes, un seuil minimum donne un suffixe de cet ordre ; les films
+        # sans nombre de votes (NaN, ajouts sans la colonne) ne passent aucun seuil
+        votes = pd.to_numeric(df['vote'], errors='coerce').to_numpy(dtype=np.float64)
+        avec_votes = np.flatnonzero(np.isfinite(votes))
+        self.ordre_votes = avec_votes[np.argsort(votes[avec_votes], kind="stable")]
+        self.votes_tries = votes[self.ordre_votes]
+
+        # Genres : colonnes du bloc creux des features (format CSC, lignes triées par colonne)
+        colonnes = modele.X.genres.tocsc()
+        colonnes.sort_indices()
+        self.genres = {genre: colonnes.indices[colonnes.indptr[j]:colonnes.indptr[j + 1]]
+                       for j, genre in enumerate(modele.genre_columns)}
+
+    def candidats(self, filtres):
+        # Positions triées des films qui passent tous les filtres (None : pas de filtre)
+        inconnus = set(filtres) - set(FILTRES)
+        if inconnus:
+            raise ValueError(f"Filtres inconnus : {sorted(inconnus)} (disponibles : {list(FILTRES)})")
+
+        listes = []
+        if filtres.get("decennie") is not None:
+            listes.append(_union(self.decennies, filtres["decennie"]))
+        if filtres.get("langue") is not None:
+            listes.append(_union(self.langues, filtres["langue"]))
+        if filtres.get("genre") is not None:
+            listes.append(_union(self.genres, filtres["genre"]))
+        if filtres.get("vote_min") is not None:
+            debut = np.searchsorted(self.votes_tries, filtres["vote_min"], side="left")
+            listes.append(np.sort(self.ordre_votes[debut:]))
+        if not listes:
+            return None
+
+        # Intersection en partant de la liste la plus courte
+        listes.sort(key=len)
+        candidats = listes[0]
+        for autre in listes[1:]:
+            candidats = np.intersect1d(candidats, autre, assume_unique=True)
+        return candidats
+
+
+def _partitionner(valeurs):
+    valeurs_uniques, codes = np.unique(valeurs, return_inverse=True)
+    ordre = np.argsort(codes.ravel(), kind="stable")
+    bornes = np.zeros(len(valeurs_uniques) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes.ravel(), minlength=len(valeurs_uniques)), out=bornes[1:])
+    return {v: ordre[bornes[i]:bornes[i + 1]] for i, v in enumerate(valeurs_uniques.tolist())}
+
+
+def _union(partition, valeurs):
+    if np.isscalar(valeurs):
+        valeurs = [valeurs]
+    morceaux = [partition.get(v, np.array([], dtype=np.int64)) for v in valeurs]
+    return np.unique(np.concatenate(morceaux)) if len(morceaux) > 1 else morceaux[0]
+
+
+def normaliser(filtres):
+    # Forme hachable des filtres (clé de cache), les filtres vides sont ignorés
+    if not filtres:
+        return ()
+    return tuple(sorted((nom, valeur if np.isscalar(valeur) else tuple(valeur))
+                        for nom, valeur in filtres.items() if valeur is not None))
+
+
+_verrou = threading.Lock()
+_partitions = weakref.WeakKeyDictionary()  # modèle -> (révision, Partitions)
+
+
+def partitions(modele):
+    with _verrou:
+        revision, resultat = _partitions.get(modele, (None, None))
+        if revision != modele.revision:
+            resultat = Partitions(modele)
+            _partitions[modele] = (modele.revision, resultat)
+        return resultat
+
+
+def chercher(modele, requetes, k, filtres):
+    # Recherche exacte limitée aux films candidats ; moins de k colonnes si le filtre laisse moins de k films
+    candidats = partitions(modele).candidats(filtres)
+    if candidats is None:
+        return modele.obtenir_index("exact").chercher(requetes, k)
+    return _chercher_candidats(modele, requetes, min(k, len(candidats)), candidats)
+
+
+def chercher_par_genre(modele, requetes, k, genres, filtres=None):
+    # Genre strict : chaque requête n'est comparée qu'aux films de son genre (et qui passent les autres filtres).
+    # Les requêtes sont groupées par genre, une recherche par partition ; un genre qui a moins de k candidats
+    # laisse des places vides en fin de ligne (distance inf, indice -1)
+    p = partitions(modele)
+    base = p.candidats(filtres or {})
+    genres = np.asarray(genres, dtype=object)
+    groupes = {}
+    for genre in dict.fromkeys(genres.tolist()):
+        candidats = _union(p.genres, genre)
+        if base is not None:
+            candidats = np.intersect1d(base, candidats, assume_unique=True)
+        groupes[genre] = candidats
+    k = min([k, max([len(c) for c in groupes.values()] + [0])])
+
+    distances = np.full((len(requetes), k), np.inf)
+    indices = np.full((len(requetes), k), -1, dtype=np.int64)
+    for genre, candidats in groupes.items():
+        k_genre = min(k, len(candidats))
+        if k_genre == 0:
+            continue
+        lignes = np.flatnonzero(genres == genre)
+        distances[lignes, :k_genre], indices[lignes, :k_genre] = _chercher_candidats(modele, requetes[lignes],
+                                                                                     k_genre, candidats)
+    return distances, indices
+
+
+def _chercher_candidats(modele, requetes, k, candidats):
+    if k == 0:
+        return np.zeros((len(requetes), 0)), np.zeros((len(requetes), 0), dtype=np.int64)
+    bloc = max(1, TAILLE_BLOC // len(candidats))
+    resultats = [plus_proches(modele.X.distances_carrees(requetes[debut:debut + bloc], candidats), k)
+                 for debut in range(0, len(requetes), bloc)]
+    distances = np.vstack([d for d, _ in resultats])
+    indices = candidats[np.vstack([i for _, i in resultats])]
+    return distances, indices
@@ -0,0 +1,172 @@
+# bibliothèques
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import ingestion
+import KNN
+import knn_index
+
+# Graphe des k plus proches voisins de chaque film (le film lui-même exclu), précalculé
+# une fois par version du modèle : indices int32 et distances float32, relus en mmap.
+# Films ajoutés (knn_ajouts) : le graphe est prolongé sans tout recalculer (voisins des nouveaux films, et
+# nouveaux films fusionnés dans le top-k des anciens). Après une reconstruction du modèle (nouvelle échelle),
+# le graphe prolongé reste servi pendant qu'un graphe complet est recalculé en arrière-plan.
+K_GRAPHE = 10
+TAILLE_BLOC = 2048
+
+_verrou = threading.Lock()  # accès à _graphes (courts)
+_verrou_maj = threading.Lock()  # une mise à jour de graphe à la fois
+_graphes = {}  # k -> Graphe servi
+_reconstructions = {}  # k -> thread de reconstruction complète en cours
+
+
+class Graphe:
+    def __init__(self, modele, revision, indices, distances, tconst):
+        self.modele = weakref.ref(modele)
+        self.version = modele.version
+        self.revision = revision
+        self.indices = indices
+        self.distances = distances
+        self.positions = pd.Index(tconst)
+
+    def a_jour(self, modele, revision):
+        return self.modele() is modele and self.revision == revision
+
+    def prolongeable(self, modele, tconst):
+        # Les films ne sont qu'ajoutés à la fin : le graphe couvre un préfixe des films du modèle
+        return (self.version == modele.version and len(self.positions) <= len(tconst)
+                and np.array_equal(self.positions.to_numpy().astype(str), tconst[:len(self.positions)]))
+
+
+def construire_graphe(modele, k=K_GRAPHE, taille_bloc=TAILLE_BLOC, n_workers=None):
+    return _voisins(modele.X, 0, k, taille_bloc, n_workers)
+
+
+def _voisins(X, debut, k, taille_bloc=TAILLE_BLOC, n_workers=None):
+    # Voisins des films X[debut:] parmi tous les films de X, par blocs de films répartis sur plusieurs
+    # threads (numpy libère le GIL pendant les calculs)
+    n = len(X)
+    k_voisins = min(k + 1, n)
+    debuts = range(debut, n, taille_bloc)
+    index = knn_index.IndexExact().ajuster(X)
+
+    def chercher(debut_bloc):
+        return index.chercher(X[debut_bloc:min(debut_bloc + taille_bloc, n)], k_voisins)
+
+    with ThreadPoolExecutor(max_workers=n_workers or os.cpu_count()) as pool:
+        resultats = list(pool.map(chercher, debuts))
+    distances = np.vstack([d for d, _ in resultats])
+    indices = np.vstack([i for _, i in resultats])
+
+    # On retire le film lui-même ; s'il n'est pas dans la liste (doublons à distance nulle), on retire le dernier
+    soi = indices == np.arange(debut, n)[:, None]
+    soi[~soi.any(axis=1), -1] = True
+    garde = ~soi
+    indices = indices[garde].reshape(n - debut, k_voisins - 1)
+    distances = distances[garde].reshape(n - debut, k_voisins - 1)
+    return indices.astype(np.int32), distances.astype(np.float32)
+
+
+def _prolonger(graphe, X, k):
+    # Graphe des films de X à partir de celui de ses premiers films : O(n x nouveaux films) au lieu de O(n²)
+    n0, n = len(graphe.positions), len(X)
+    if n0 == n:
+        return graphe.indices, graphe.distances
+    indices_nouveaux, distances_nouveaux = _voisins(X, n0, k)
+
+    # Anciens films : leur top-k fusionné avec les distances aux nouveaux films (ex aequo départagés par l'indice)
+    largeur = min(k, n - 1)
+    nouveaux = X[n0:]
+    bloc = max(1, knn_index.TAILLE_BLOC // (n - n0))
+    morceaux_indices, morceaux_distances = [], []
+    for debut in range(0, n0, bloc):
+        fin = min(debut + bloc, n0)
+        distances = np.hstack([graphe.distances[debut:fin],
+                               np.sqrt(nouveaux.distances_carrees(X[debut:fin])).astype(np.float32)])
+        indices = np.hstack([graphe.indices[debut:fin],
+                             np.broadcast_to(np.arange(n0, n, dtype=np.int32), (fin - debut, n - n0))])
+        ordre = np.lexsort((indices, distances), axis=1)[:, :largeur]
+        morceaux_indices.append(np.take_along_axis(indices, ordre, axis=1))
+        morceaux_distances.append(np.take_along_axis(distances, ordre, axis=1))
+    return (np.vstack(morceaux_indices + [indices_nouveaux[:, :largeur]]),
+            np.vstack(morceaux_distances + [distances_nouveaux[:, :largeur]]))
+
+
+def _graphe_initial(modele, k):
+    # Graphe de la version du modèle (révision 0), sauvegardé avec l'artefact
+    dossier = os.path.join(KNN.dossier_modele(modele.version), f"graphe-k{k}")
+    if not os.path.exists(os.path.join(dossier, "meta.json")):
+        indices, distances = construire_graphe(modele, k)
+        ingestion.sauver_tableaux(dossier, {"indices": indices, "distances": distances},
+                                  {"version": modele.version, "k": k})
+    return ingestion.charger_tableau(dossier, "indices"), ingestion.charger_tableau(dossier, "distances")
+
+
+def _lancer_reconstruction(modele, X, tconst, revision, k):
+    # Graphe complet du modèle reconstruit, calculé hors des verrous puis mis à la place du graphe prolongé
+    # (si le modèle servi n'a pas changé entre-temps ; les révisions suivantes le prolongent à leur tour)
+    if k in _reconstructions:
+        return
+
+    def executer():
+        try:
+            indices, distances = _voisins(X, 0, k)
+            with _verrou_maj:
+                actuel = _graphes.get(k)
+                if actuel is not None and actuel.modele() is modele:
+                    with _verrou:
+                        _graphes[k] = Graphe(modele, revision, indices, distances, tconst)
+        finally:
+            _reconstructions.pop(k, None)
+
+    thread = threading.Thread(target=executer, name="graphe-knn", daemon=True)
+    _reconstructions[k] = thread
+    thread.start()
+
+
+def obtenir_graphe(k=K_GRAPHE):
+    modele = KNN.obtenir_modele()
+    with modele._verrou:
+        revision, X, tconst = modele.revision, modele.X, modele.tconst
+    with _verrou:
+        graphe = _graphes.get(k)
+    if graphe is None or not graphe.a_jour(modele, revision):
+        with _verrou_maj:
+            graphe = _graphes.get(k)
+            if graphe is None or not graphe.a_jour(modele, revision):
+                prolongeable = graphe is not None and graphe.prolongeable(modele, tconst)
+                if prolongeable and graphe.modele() is modele:
+                    # Films ajoutés au même modèle
+                    indices, distances = _prolonger(graphe, X, k)
+                elif prolongeable and revision > 0:
+                    # Modèle reconstruit (nouvelle échelle) : graphe précédent prolongé, servi en attendant le complet
+                    _lancer_reconstruction(modele, X, tconst, revision, k)
+                    indices, distances = _prolonger(graphe, X, k)
+                elif revision == 0:
+                    indices, distances = _graphe_initial(modele, k)
+                else:
+                    indices, distances = _voisins(X, 0, k)
+                graphe = Graphe(modele, revision, indices, distances, tconst)
+                with _verrou:
+                    _graphes[k] = graphe
+    return graphe.indices, graphe.distances, graphe.positions
+
+
+def films_similaires(tconst, k=5):
+    # Les k films les plus proches d'un film donné, lus dans le graphe précalculé
+    if k > K_GRAPHE:
+        raise ValueError(f"k doit être inférieur ou égal à {K_GRAPHE} (taille du graphe)")
+    indices, distances, positions = obtenir_graphe()
+    try:
+        ligne = positions.get_loc(tconst)
+    except KeyError:
+        raise KeyError(f"Film inconnu : {tconst!r}") from None
+    voisins = np.asarray(indices[ligne, :k])
+    films = KNN.obtenir_modele().films(voisins).copy()
+    films.insert(0, 'distance', np.asarray(distances[ligne, :k]))
+    return films
@@ -0,0 +1,287 @@
+# bibliothèques
+import copy
+import time
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import NearestNeighbors
+
+from knn_features import MatriceFeatures
+
+# Index de recherche des plus proches voisins utilisés par le recommandeur.
+# Tous les index ont la même interface : ajuster(X) puis chercher(requetes, k) -> (distances, indices),
+# comme NearestNeighbors.kneighbors, et ajouter(X) quand des lignes ont été ajoutées à la fin de X.
+# ajouter renvoie un nouvel index sans modifier l'ancien, que d'autres threads peuvent être en train de parcourir.
+# X et les requêtes sont des MatriceFeatures.
+
+# Nombre de distances calculées à la fois (requêtes x films) par la recherche exacte
+TAILLE_BLOC = 2 ** 22
+
+# Sélection du top-k : chaque ligne est découpée en TAILLE_TUILE groupes de colonnes entrelacées
+TAILLE_TUILE = 32
+# Au-delà de FACTEUR_REPLI * k groupes candidats dans une ligne (nombreux ex aequo), sélection par np.partition
+FACTEUR_REPLI = 4
+
+
+def plus_proches(d, k, racine=True):
+    # Les k plus petites distances au carré de chaque ligne, triées (ex aequo départagés par l'indice) ;
+    # racine=False pour des distances qui ne sont pas des carrés
+    n_lignes, n = d.shape
+    k = min(k, n)
+    if n < 2 * max(k, 8) * TAILLE_TUILE:
+        # Lignes courtes : un tri stable suffit
+        positions = np.argsort(d, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(d, positions, axis=1).astype(np.float64)
+        return np.sqrt(distances) if racine else distances, positions
+
+    # Grandes lignes : le minimum de chaque groupe de colonnes {j, j + largeur, j + 2 largeur...} est calculé
+    # en une réduction vectorisée ; le k-ième plus petit de ces minimums borne la k-ième distance, et seuls
+    # les groupes dont le minimum passe sous cette borne (plus les colonnes restantes) sont examinés.
+    largeur = n // TAILLE_TUILE
+    fin = largeur * TAILLE_TUILE
+    minima = d[:, :fin].reshape(n_lignes, TAILLE_TUILE, largeur).min(axis=1)
+    seuils = np.partition(minima, k - 1, axis=1)[:, k - 1]
+    candidats = minima <= seuils[:, None]
+
+    # Lignes où beaucoup de valeurs égalent le seuil : presque toutes les colonnes seraient triées
+    repli = candidats.sum(axis=1) > FACTEUR_REPLI * k
+    if repli.any():
+        distances = np.empty((n_lignes, k))
+        positions = np.empty((n_lignes, k), dtype=np.int64)
+        lignes_repli = np.flatnonzero(repli)
+        bloc = max(1, TAILLE_BLOC // n)
+        for debut in range(0, len(lignes_repli), bloc):
+            lignes_bloc = lignes_repli[debut:debut + bloc]
+            distances[lignes_bloc], positions[lignes_bloc] = _k_premiers(d[lignes_bloc], k)
+        autres = np.flatnonzero(~repli)
+        if len(autres):
+            distances[autres], positions[autres] = plus_proches(d[autres], k, racine=False)
+        return np.sqrt(distances) if racine else distances, positions
+
+    lignes, groupes = np.nonzero(candidats)
+    colonnes = (groupes[:, None] + np.arange(TAILLE_TUILE) * largeur).ravel()
+    lignes = np.repeat(lignes, TAILLE_TUILE)
+    if fin < n:
+        lignes = np.concatenate([lignes, np.repeat(np.arange(n_lignes), n - fin)])
+        colonnes = np.concatenate([colonnes, np.tile(np.arange(fin, n), n_lignes)])
+    valeurs = d[lignes, colonnes]
+    garde = valeurs <= seuils[lignes]
+    lignes, colonnes, valeurs = lignes[garde], colonnes[garde], valeurs[garde]
+
+    # Au moins k candidats par ligne : tri par (ligne, distance, indice) puis les k premiers de chaque ligne
+    ordre = np.lexsort((colonnes, valeurs, lignes))
+    debuts = np.zeros(n_lignes, dtype=np.int64)
+    np.cumsum(np.bincount(lignes, minlength=n_lignes)[:-1], out=debuts[1:])
+    choisis = ordre[debuts[:, None] + np.arange(k)]
+    distances = valeurs[choisis].astype(np.float64)
+    return np.sqrt(distances) if racine else distances, colonnes[choisis]
+
+
+def _k_premiers(d, k):
+    # Top-k par np.partition : la k-ième valeur de chaque ligne, les valeurs strictement inférieures et
+    # les premières colonnes égales à cette valeur (ex aequo départagés par l'indice), puis tri stable
+    seuils = np.partition(d, k - 1, axis=1)[:, k - 1:k]
+    dessous = d < seuils
+    egales = d == seuils
+    manquantes = k - dessous.sum(axis=1, keepdims=True)
+    choisies = dessous | (egales & (np.cumsum(egales, axis=1) <= manquantes))
+    colonnes = np.nonzero(choisies)[1].reshape(len(d), k)
+    valeurs = np.take_along_axis(d, colonnes, axis=1)
+    ordre = np.argsort(valeurs, axis=1, kind="stable")
+    return np.take_along_axis(valeurs, ordre, axis=1).astype(np.float64), np.take_along_axis(colonnes, ordre, axis=1)
+
+
+class IndexExact:
+    # Recherche exacte : noyau creux de MatriceFeatures pour la distance euclidienne, sklearn sinon
+    nom = "exact"
+
+    def __init__(self, metric='euclidean', taille_bloc=TAILLE_BLOC):
+        self.metric = metric
+        self.taille_bloc = taille_bloc
+        self.model = None
+
+    def ajuster(self, X):
+        self.X = X
+        self.model = None
+        if not (isinstance(X, MatriceFeatures) and self.metric == 'euclidean'):
+            self.model = NearestNeighbors(metric=self.metric).fit(_pour_sklearn(X))
+        return self
+
+    def ajouter(self, X):
+        # X contient les anciennes lignes suivies des nouvelles : rien à apprendre pour une recherche exacte
+        return copy.copy(self).ajuster(X)
+
+    def chercher(self, requetes, k):
+        if self.model is not None:
+            return self.model.kneighbors(_pour_sklearn(requetes), n_neighbors=k)
+        bloc = max(1, self.taille_bloc // max(1, len(self.X)))
+        resultats = [plus_proches(self.X.distances_carrees(requetes[debut:debut + bloc]), k)
+                     for debut in range(0, len(requetes), bloc)]
+        return np.vstack([d for d, _ in resultats]), np.vstack([i for _, i in resultats])
+
+
+def _pour_sklearn(X):
+    return X.tocsr() if isinstance(X, MatriceFeatures) else X
+
+
+class IndexBLAS:
+    # Recherche exacte sur la matrice dense : normes au carré précalculées (ajoutées comme dernière colonne de X),
+    # un seul produit matriciel (BLAS) par bloc de requêtes puis sélection du top-k (plus_proches). Les blocs de requêtes sont dimensionnés pour que les
+    # distances du bloc tiennent dans octets_bloc : assez grand pour ne pas relire X pour quelques requêtes
+    # seulement, assez petit pour borner la mémoire. Métriques : "euclidean" ou "cosine" (1 - similarité).
+    # float64 par défaut : en float32 (deux fois plus rapide), |q|² - 2 q.x + |x|² peut intervertir
+    # des voisins presque à égalité.
+    nom = "blas"
+
+    def __init__(self, metric='euclidean', octets_bloc=64 * 1024 * 1024, dtype=np.float64):
+        if metric not in ('euclidean', 'cosine'):
+            raise ValueError(f"Métrique non gérée par l'index blas : {metric!r}")
+        self.metric = metric
+        self.octets_bloc = octets_bloc
+        self.dtype = dtype
+
+    def _preparer(self, X):
+        X = np.asarray(X.toarray() if isinstance(X, MatriceFeatures) else X, dtype=self.dtype)
+        normes = np.einsum('ij,ij->i', X, X)
+        if self.metric == 'cosine':
+            X = X / np.sqrt(np.where(normes > 0, normes, 1))[:, None]
+            normes = np.einsum('ij,ij->i', X, X)
+        return X, normes
+
+    def ajuster(self, X):
+        # X stocké transposé (une ligne par feature) : le produit parcourt la mémoire dans l'ordre
+        X, normes = self._preparer(X)
+        if self.metric == 'euclidean':
+            X = np.hstack([X, normes[:, None]])
+        self.XT = np.ascontiguousarray(X.T)
+        return self
+
+    def ajouter(self, X):
+        return copy.copy(self).ajuster(X)
+
+    def chercher(self, requetes, k):
+        # Produit : -2 q.x + |x|² (euclidean) ou -q.x (cosine) ; le terme propre à chaque requête (|q|² ou 1)
+        # ne change pas l'ordre et n'est ajouté qu'aux k retenus
+        requetes, normes_requetes = self._preparer(requetes)
+        if self.metric == 'euclidean':
+            requetes = np.hstack([-2 * requetes, np.ones((len(requetes), 1), dtype=self.dtype)])
+        else:
+            requetes = -requetes
+        n = self.XT.shape[1]
+        k = min(k, n)
+        bloc = max(1, self.octets_bloc // (n * np.dtype(self.dtype).itemsize))
+        distances = np.empty((len(requetes), k))
+        indices = np.empty((len(requetes), k), dtype=np.int64)
+        for debut in range(0, len(requetes), bloc):
+            fin = debut + bloc
+            d = requetes[debut:fin] @ self.XT
+            distances[debut:fin], indices[debut:fin] = plus_proches(d, k, racine=False)
+
+        if self.metric == 'cosine':
+            return np.maximum(distances + 1, 0), indices
+        return np.sqrt(np.maximum(distances + normes_requetes[:, None], 0)), indices
+
+
+class IndexIVF:
+    # Recherche approchée par listes inversées : les films sont répartis en n_listes groupes (k-means) et
+    # une requête n'est comparée qu'aux films des n_sondes groupes dont le centre est le plus proche.
+    # Plus n_sondes est grand, meilleur est le rappel et plus la recherche est lente.
+    nom = "ivf"
+
+    def __init__(self, n_listes=None, n_sondes=8, taille_echantillon=100_000, graine=0):
+        self.n_listes = n_listes
+        self.n_sondes = n_sondes
+        self.taille_echantillon = taille_echantillon
+        self.graine = graine
+
+    def ajuster(self, X):
+        self.X = X
+        n = len(X)
+        n_listes = self.n_listes or max(1, int(np.sqrt(n)))
+        n_listes = min(n_listes, n)
+
+        # Centres appris sur un échantillon, puis affectation de tous les films par blocs
+        rng = np.random.default_rng(self.graine)
+        echantillon = X if n <= self.taille_echantillon else X[np.sort(rng.choice(n, self.taille_echantillon, replace=False))]
+        kmeans = MiniBatchKMeans(n_clusters=n_listes, random_state=self.graine, n_init=3).fit(echantillon.toarray())
+        self.centres = kmeans.cluster_centers_
+        self._lister(np.concatenate([self._affecter(X[debut:debut + 65536]) for debut in range(0, n, 65536)]))
+        return self
+
+    def ajouter(self, X):
+        # Les nouvelles lignes (à la fin de X) rejoignent la liste de leur centre le plus proche, sans réapprendre
+        # les centres ; nouvel index, self n'est pas modifié
+        nouveau = copy.copy(self)
+        nouvelles = X[len(self.groupes):]
+        if self.centres.shape[1] < nouvelles.shape[1]:  # nouveaux genres : coordonnée nulle pour les centres
+            nouveau.centres = np.hstack([self.centres, np.zeros((len(self.centres), nouvelles.shape[1] - self.centres.shape[1]))])
+        groupes = np.concatenate([self.groupes] + [nouveau._affecter(nouvelles[debut:debut + 65536])
+                                                   for debut in range(0, len(nouvelles), 65536)])
+        nouveau.X = X
+        nouveau._lister(groupes)
+        return nouveau
+
+    def _affecter(self, X):
+        denses = X.toarray().astype(np.float64)
+        distances = (-2 * denses @ self.centres.T + (self.centres ** 2).sum(axis=1)[None, :])
+        return distances.argmin(axis=1)
+
+    def _lister(self, groupes):
+        # Listes inversées : films triés par groupe, avec les bornes de chaque groupe
+        self.groupes = groupes
+        self.ordre = np.argsort(groupes, kind="stable")
+        self.bornes = np.zeros(len(self.centres) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(groupes, minlength=len(self.centres)), out=self.bornes[1:])
+
+    def _candidats(self, distances_centres, k):
+        # Films des n_sondes groupes les plus proches (plus si cela ne suffit pas pour trouver k films)
+        groupes = np.argsort(distances_centres)
+        tailles = np.diff(self.bornes)[groupes]
+        n_sondes = max(self.n_sondes, int(np.searchsorted(np.cumsum(tailles), k) + 1))
+        return np.concatenate([self.ordre[self.bornes[g]:self.bornes[g + 1]] for g in groupes[:n_sondes]])
+
+    def chercher(self, requetes, k):
+        denses = requetes.toarray().astype(np.float64)
+        distances_centres = ((denses ** 2).sum(axis=1)[:, None] - 2 * denses @ self.centres.T
+                             + (self.centres ** 2).sum(axis=1)[None, :])
+        distances = np.full((len(requetes), k), np.inf)
+        indices = np.full((len(requetes), k), -1, dtype=np.int64)
+        for i in range(len(requetes)):
+            candidats = np.sort(self._candidats(distances_centres[i], k))
+            d, meilleurs = plus_proches(self.X.distances_carrees(requetes[i:i + 1], candidats), k)
+            m = meilleurs.shape[1]
+            distances[i, :m] = d[0]
+            indices[i, :m] = candidats[meilleurs[0]]
+        return distances, indices
+
+
+BACKENDS = {
+    IndexExact.nom: IndexExact,
+    IndexBLAS.nom: IndexBLAS,
+    IndexIVF.nom: IndexIVF,
+}
+
+
+def creer_index(nom, **params):
+    if nom not in BACKENDS:
+        raise ValueError(f"Index inconnu : {nom!r} (disponibles : {sorted(BACKENDS)})")
+    return BACKENDS[nom](**params)
+
+
+def evaluer(index, reference, requetes, k=5):
+    # Rappel@k de l'index par rapport à la recherche de référence (exacte), et latence moyenne par requête
+    debut = time.perf_counter()
+    _, attendus = reference.chercher(requetes, k)
+    latence_reference = (time.perf_counter() - debut) / len(requetes)
+
+    debut = time.perf_counter()
+    _, trouves = index.chercher(requetes, k)
+    latence = (time.perf_counter() - debut) / len(requetes)
+
+    communs = sum(len(np.intersect1d(a, t)) for a, t in zip(attendus, trouves))
+    return {
+        "index": index.nom,
+        "rappel": communs / attendus.size,
+        "latence_ms": latence * 1000,
+        "latence_reference_ms": latence_reference * 1000,
+    }
@@ -0,0 +1,146 @@
+# bibliothèques
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+import KNN
+import ingestion
+from knn_index import plus_proches
+from listes import analyser_listes
+
+# Réglage des poids des features et de la métrique du recommandeur :
+#   python knn_reglage.py --poids 0.5,1,2 --metrics euclidean,cosine
+# Les films d'un échantillon servent de requêtes ; un voisin est pertinent s'il partage un réalisateur
+# (ou un scénariste) avec la requête. Chaque essai (poids, métrique) est noté par la précision@k.
+# Les distances sont décomposées par bloc de features (chaque colonne numérique, puis les genres) et ces blocs
+# sont calculés une seule fois, sur disque, puis relus en mmap par tous les processus : un essai ne fait
+# qu'une somme pondérée des blocs et une sélection du top-k, sans recalculer ni réajuster le modèle.
+BLOCS = KNN.numeric_features + ["genres"]
+N_REQUETES = 300
+K = 5
+
+
+def _incidence(df_movies, signal):
+    # Matrice creuse films x personnes (réalisateurs ou scénaristes) ; les valeurs manquantes (\\N) sont ignorées
+    personnes = analyser_listes(df_movies[signal])
+    gardees = personnes.valeurs != "\\N"
+    films = df_movies.index.get_indexer(personnes.index)[personnes.lignes()][gardees]
+    codes = np.unique(personnes.valeurs[gardees], return_inverse=True)[1].ravel()
+    incidence = sp.csr_matrix((np.ones(len(films), dtype=np.float32), (films, codes)),
+                              shape=(len(df_movies), codes.max() + 1 if len(codes) else 0))
+    incidence.data[:] = 1  # une personne citée deux fois pour le même film
+    return incidence
+
+
+def preparer(n_requetes=N_REQUETES, signal="director", graine=0):
+    # Blocs de distances et pertinence écrits une fois par (version du modèle, échantillon) ; renvoie le dossier
+    modele = KNN.obtenir_modele()
+    dossier = os.path.join(KNN.dossier_modele(modele.version), f"reglage-{signal}-{n_requetes}-{graine}")
+    if os.path.exists(os.path.join(dossier, "meta.json")):
+        return dossier
+
+    # Requêtes : films qui partagent une personne avec au moins un autre film ; pertinents : ces autres films
+    incidence = _incidence(modele.df_movies, signal)
+    partages = incidence @ (incidence.T @ np.ones(len(modele.df_movies), dtype=np.float32)) > incidence.sum(axis=1).A1
+    candidates = np.flatnonzero(partages)
+    if len(candidates) == 0:
+        raise ValueError(f"Aucun film ne partage de valeur de {signal!r} avec un autre : pas de signal de pertinence")
+    rng = np.random.default_rng(graine)
+    requetes = np.sort(rng.choice(candidates, min(n_requetes, len(candidates)), replace=False))
+    pertinents = (incidence[requetes] @ incidence.T).tolil()
+    pertinents[np.arange(len(requetes)), requetes] = 0  # la requête elle-même n'est pas une recommandation
+    pertinents = pertinents.tocsr()
+    pertinents.eliminate_zeros()
+
+    X, Q = modele.X, modele.X[requetes]
+    tableaux = {"requetes": requetes}
+    for j, bloc in enumerate(KNN.numeric_features):
+        ecart = X.numeriques[None, :, j] - Q.numeriques[:, j, None]
+        tableaux[f"ecarts_{bloc}"] = ecart * ecart
+        tableaux[f"normes_{bloc}"] = X.numeriques[:, j].astype(np.float64) ** 2
+        tableaux[f"normes_requetes_{bloc}"] = Q.numeriques[:, j].astype(np.float64) ** 2
+    produit = (X.genres @ Q.genres.T.toarray()).T
+    tableaux["ecarts_genres"] = np.maximum(Q.normes_genres[:, None] + X.normes_genres[None, :] - 2 * produit, 0,
+                                           dtype=np.float32)
+    tableaux["normes_genres"] = X.normes_genres.astype(np.float64)
+    tableaux["normes_requetes_genres"] = Q.normes_genres.astype(np.float64)
+
+    tableaux.update(pertinents_lignes=pertinents.indptr, pertinents_colonnes=pertinents.indices)
+    ingestion.sauver_tableaux(dossier, tableaux, {"version": modele.version, "signal": signal, "n_films": len(X)})
+    return dossier
+
+
+_blocs = {}  # dossier -> tableaux ouverts en mmap (un jeu par processus)
+
+
+def _ouvrir(dossier):
+    if dossier not in _blocs:
+        meta = ingestion.lire_meta(dossier)
+        tableaux = {nom[:-4]: ingestion.charger_tableau(dossier, nom[:-4])
+                    for nom in os.listdir(dossier) if nom.endswith(".npy")}
+        tableaux["pertinents"] = sp.csr_matrix(
+            (np.ones(len(tableaux["pertinents_colonnes"]), dtype=bool), tableaux["pertinents_colonnes"],
+             tableaux["pertinents_lignes"]), shape=(len(tableaux["requetes"]), meta["n_films"]))
+        _blocs[dossier] = tableaux
+    return _blocs[dossier]
+
+
+def essai(dossier, poids, metric, k=K):
+    # Précision@k pour un jeu de poids (un par bloc) et une métrique, avec le temps de l'essai
+    debut = time.perf_counter()
+    t = _ouvrir(dossier)
+    carres = {bloc: p * p for bloc, p in zip(BLOCS, poids)}
+
+    # Distance euclidienne pondérée : somme des écarts de chaque bloc ; cosinus : produits scalaires des blocs
+    # (q.x = (|q|² + |x|² - écart) / 2), normalisés par les normes pondérées
+    d = sum(carres[bloc] * t[f"ecarts_{bloc}"] for bloc in BLOCS)
+    if metric == "cosine":
+        normes = sum(carres[bloc] * t[f"normes_{bloc}"] for bloc in BLOCS)
+        normes_requetes = sum(carres[bloc] * t[f"normes_requetes_{bloc}"] for bloc in BLOCS)
+        produits = (normes_requetes[:, None] + normes[None, :] - d) / 2
+        d = 1 - produits / np.sqrt(np.maximum(normes_requetes[:, None] * normes[None, :], 1e-12))
+    elif metric != "euclidean":
+        raise ValueError(f"Métrique inconnue : {metric!r}")
+    d = np.asarray(d, dtype=np.float32)
+    d[np.arange(len(d)), t["requetes"]] = np.inf  # la requête elle-même n'est pas une recommandation
+
+    _, voisins = plus_proches(d, k, racine=False)
+    trouves = np.asarray(t["pertinents"][np.repeat(np.arange(len(d)), k), voisins.ravel()]).reshape(voisins.shape)
+    return {**dict(zip(BLOCS, poids)), "metric": metric, "precision": float(trouves.mean()),
+            "secondes": time.perf_counter() - debut}
+
+
+def regler(poids=(0.5, 1, 2), metrics=("euclidean", "cosine"), n_requetes=N_REQUETES, signal="director",
+           k=K, n_workers=None):
+    # Tous les essais de la grille, du meilleur au moins bon
+    dossier = preparer(n_requetes, signal)
+    grille = [(p, m) for p in itertools.product(poids, repeat=len(BLOCS)) for m in metrics]
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        resultats = list(pool.map(essai, *zip(*[(dossier, p, m, k) for p, m in grille]), chunksize=8))
+    return pd.DataFrame(resultats).sort_values("precision", ascending=False, kind="stable").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réglage des poids des features et de la métrique du recommandeur")
+    parser.add_argument("--poids", default="0.5,1,2", help="valeurs essayées pour le poids de chaque bloc")
+    parser.add_argument("--metrics", default="euclidean,cosine")
+    parser.add_argument("--requetes", type=int, default=N_REQUETES, help="nombre de films utilisés comme requêtes")
+    parser.add_argument("--signal", default="director", choices=["director", "writer"])
+    parser.add_argument("-k", type=int, default=K)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    debut = time.perf_counter()
+    resultats = regler([float(p) for p in args.poids.split(",")], args.metrics.split(","), args.requetes,
+                       args.signal, args.k, args.workers)
+    total = time.perf_counter() - debut
+    print(resultats.head(10).to_string())
+    print(f"\nMeilleure configuration : {resultats.iloc[0].to_dict()}")
+    print(f"{len(resultats)} essais en {total:.1f} s, {resultats['secondes'].mean() * 1000:.1f} ms par essai en moyenne")
@@ -0,0 +1,142 @@
+# bibliothèques
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+import KNN
+
+# Serveur de recommandations pour les appels concurrents : les requêtes reçues pendant une courte fenêtre
+# (quelques millisecondes) sont regroupées en un lot, cherché en une seule fois, et chaque appelant
+# reçoit son résultat par un Future.
+FENETRE_MS = 2.0
+TAILLE_MAX_LOT = 256
+N_LATENCES = 10_000  # latences gardées pour les percentiles
+
+
+def _tranche(n):
+    # Classe d'histogramme : puissance de 2 supérieure ou égale
+    return 1 << max(0, n - 1).bit_length()
+
+
+def _echouer(futures, erreur):
+    for future in futures:
+        if not future.done():
+            future.set_exception(erreur)
+
+
+class ServeurRecommandations:
+    def __init__(self, fenetre_ms=FENETRE_MS, taille_max=TAILLE_MAX_LOT, index=None, k=5):
+        self.fenetre = fenetre_ms / 1000
+        self.taille_max = taille_max
+        self.index = index
+        self.k = k
+        self._file = queue.Queue()
+        self._verrou = threading.Lock()
+        self._profondeurs = Counter()
+        self._tailles = Counter()
+        self._latences = deque(maxlen=N_LATENCES)
+        self._n_requetes = 0
+        self._thread = threading.Thread(target=self._boucle, name="serveur-knn", daemon=True)
+        self._thread.start()
+
+    def soumettre(self, rate, year, runtime, budget, selected_genre):
+        # Future dont le résultat est le même DataFrame que get_movie_recommendations
+        future = Future()
+        if not self._thread.is_alive():
+            raise RuntimeError("Le serveur de recommandations est arrêté")
+        self._file.put(((rate, year, runtime, budget, selected_genre), future, time.perf_counter()))
+        return future
+
+    def recommander(self, rate, year, runtime, budget, selected_genre, timeout=None):
+        return self.soumettre(rate, year, runtime, budget, selected_genre).result(timeout)
+
+    def arreter(self):
+        self._file.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.arreter()
+
+    def _boucle(self):
+        while True:
+            premiere = self._file.get()
+            if premiere is None:
+                return
+            profondeur = self._file.qsize() + 1
+            lot = [premiere]
+            echeance = time.perf_counter() + self.fenetre
+            arret = False
+            while len(lot) < self.taille_max:
+                restant = echeance - time.perf_counter()
+                try:
+                    requete = self._file.get(timeout=restant) if restant > 0 else self._file.get_nowait()
+                except queue.Empty:
+                    break
+                if requete is None:
+                    arret = True
+                    break
+                lot.append(requete)
+
+            try:
+                self._traiter(lot)
+            except Exception as e:
+                # Aucune erreur ne doit arrêter le thread : les requêtes du lot encore en attente la reçoivent
+                _echouer([future for _, future, _ in lot], e)
+            with self._verrou:
+                self._profondeurs[_tranche(profondeur)] += 1
+                self._tailles[_tranche(len(lot))] += 1
+            if arret:
+                return
+
+    def _traiter(self, lot):
+        # Entrées arrondies comme dans get_movie_recommendations, pour renvoyer les mêmes films ; une requête
+        # invalide échoue seule, le reste du lot est cherché normalement
+        valides, valeurs = [], []
+        for requete in lot:
+            try:
+                valeurs.append(KNN.quantifier(*requete[0])[1])
+            except (TypeError, ValueError, OverflowError) as e:
+                _echouer([requete[1]], e)
+            else:
+                valides.append(requete)
+        if not valides:
+            return
+        lot = valides
+
+        try:
+            modele = KNN.obtenir_modele()
+            requetes = KNN.construire_requetes(modele, *zip(*valeurs))
+            _, indices = modele.obtenir_index(self.index).chercher(requetes, self.k)
+            films = modele.films(indices.ravel())  # une seule lecture pour tout le lot
+        except Exception as e:
+            _echouer([future for _, future, _ in lot], e)
+            return
+
+        fin = time.perf_counter()
+        k = indices.shape[1]
+        for i, (_, future, debut) in enumerate(lot):
+            if not future.done():  # annulé par l'appelant entre-temps
+                future.set_result(films.iloc[i * k:(i + 1) * k])
+        with self._verrou:
+            self._latences.extend(fin - debut for _, _, debut in lot)
+            self._n_requetes += len(lot)
+
+    def statistiques(self):
+        # Histogrammes (classes en puissances de 2) de la profondeur de file au début de chaque lot et de la taille
+        # des lots, et percentiles de latence (attente + recherche) en millisecondes
+        with self._verrou:
+            latences = np.array(self._latences) * 1000
+            return {
+                "profondeur_file": dict(sorted(self._profondeurs.items())),
+                "taille_lots": dict(sorted(self._tailles.items())),
+                "requetes": self._n_requetes,
+                "latence_p50_ms": float(np.percentile(latences, 50)) if len(latences) else None,
+                "latence_p99_ms": float(np.percentile(latences, 99)) if len(latences) else None,
+            }
@@ -0,0 +1,122 @@
+# bibliothèques
+import copy
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse as sp
+
+import knn_index
+from knn_features import MatriceFeatures
+
+# Recherche exacte répartie sur plusieurs cœurs : la matrice des features est copiée une fois en mémoire
+# partagée, découpée en tranches de lignes (shards) cherchées chacune par un processus du pool, puis les
+# top-k de chaque tranche sont fusionnés en un top-k global exact.
+
+_TABLEAUX = ("numeriques_t", "genres_valeurs", "genres_colonnes", "genres_lignes", "normes_genres")
+
+
+class IndexShards:
+    nom = "shards"
+
+    def __init__(self, n_shards=None, n_workers=None):
+        self.n_workers = n_workers or os.cpu_count()
+        self.n_shards = n_shards or self.n_workers
+        self._pool = None
+        self._finaliseur = None
+
+    def ajuster(self, X):
+        # Segments propres à cet objet, libérés quand il n'est plus référencé (aucune recherche en cours ne
+        # l'utilise alors) ou par fermer()
+        if self._finaliseur is not None:
+            self._finaliseur()
+        tableaux = {
+            "numeriques_t": X.numeriques.T,
+            "genres_valeurs": X.genres.data,
+            "genres_colonnes": X.genres.indices,
+            "genres_lignes": X.genres.indptr,
+            "normes_genres": X.normes_genres,
+        }
+        segments, description = [], {"n_genres": X.genres.shape[1]}
+        for nom, tableau in tableaux.items():
+            segment = shared_memory.SharedMemory(create=True, size=max(1, tableau.nbytes))
+            np.ndarray(tableau.shape, tableau.dtype, buffer=segment.buf)[...] = tableau
+            segments.append(segment)
+            description[nom] = (segment.name, tableau.shape, tableau.dtype.str)
+        self.description = description
+        self.bornes = np.linspace(0, len(X), min(self.n_shards, max(1, len(X))) + 1).astype(np.int64)
+        self._finaliseur = weakref.finalize(self, _liberer, segments)
+        if self._pool is None:
+            self._pool = _Pool(self.n_workers)
+        return self
+
+    def ajouter(self, X):
+        # Nouvel index sur de nouveaux segments, avec le même pool de processus ; les segments de self restent
+        # valides pour les recherches en cours
+        nouveau = copy.copy(self)
+        nouveau._finaliseur = None
+        return nouveau.ajuster(X)
+
+    def chercher(self, requetes, k):
+        futures = [self._pool.executeur.submit(_chercher_tranche, self.description, int(debut), int(fin), requetes, k)
+                   for debut, fin in zip(self.bornes[:-1], self.bornes[1:]) if fin > debut]
+        resultats = [f.result() for f in futures]
+        distances = np.hstack([d for d, _ in resultats])
+        indices = np.hstack([i for _, i in resultats])
+
+        # Fusion : tri de chaque ligne par (distance, indice), les k premiers
+        ordre = np.lexsort((indices, distances), axis=1)[:, :k]
+        return np.take_along_axis(distances, ordre, axis=1), np.take_along_axis(indices, ordre, axis=1)
+
+    def fermer(self):
+        self._finaliseur()
+        self._pool.fermer()
+
+
+class _Pool:
+    # Pool de processus partagé par un index et ceux que ajouter en dérive ; arrêté quand aucun ne l'utilise plus
+    def __init__(self, n_workers):
+        self.executeur = ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.fermer = weakref.finalize(self, self.executeur.shutdown, wait=False, cancel_futures=True)
+
+
+def _liberer(segments):
+    for segment in segments:
+        segment.close()
+        segment.unlink()
+
+
+# Côté processus du pool : la matrice est rattachée à la mémoire partagée une fois par description
+_attachee = {"cle": None, "segments": [], "X": None}
+
+
+def _attacher(description):
+    cle = tuple(description[nom][0] for nom in _TABLEAUX)
+    if _attachee["cle"] != cle:
+        for segment in _attachee["segments"]:
+            segment.close()
+        segments, tableaux = [], {}
+        for nom in _TABLEAUX:
+            nom_segment, forme, dtype = description[nom]
+            # Les processus du pool partagent le suivi des ressources du processus principal,
+            # qui reste seul à supprimer les segments (fermer, ou index plus référencé)
+            segment = shared_memory.SharedMemory(name=nom_segment)
+            segments.append(segment)
+            tableaux[nom] = np.ndarray(forme, np.dtype(dtype), buffer=segment.buf)
+        genres = sp.csr_matrix((tableaux["genres_valeurs"], tableaux["genres_colonnes"], tableaux["genres_lignes"]),
+                               shape=(tableaux["numeriques_t"].shape[1], description["n_genres"]), copy=False)
+        _attachee.update(cle=cle, segments=segments,
+                         X=MatriceFeatures(tableaux["numeriques_t"].T, genres, tableaux["normes_genres"]))
+    return _attachee["X"]
+
+
+def _chercher_tranche(description, debut, fin, requetes, k):
+    tranche = _attacher(description)[debut:fin]
+    distances, indices = knn_index.IndexExact().ajuster(tranche).chercher(requetes, k)
+    return distances, indices + debut
+
+
+knn_index.BACKENDS[IndexShards.nom] = IndexShards
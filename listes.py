@@ -0,0 +1,57 @@
+# bibliothèques
+import numpy as np
+import pandas as pd
+
+# Caractères retirés des chaînes du type "['nm0000001', 'nm0000002']"
+_SUPPRESSIONS = str.maketrans("", "", "'[]")
+
+
+class ListesAplaties:
+    # Valeurs de toutes les listes mises bout à bout, avec les bornes de chaque ligne :
+    # les valeurs de la ligne i sont valeurs[offsets[i]:offsets[i + 1]]
+    def __init__(self, valeurs, offsets, index):
+        self.valeurs = valeurs
+        self.offsets = offsets
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def longueurs(self):
+        return np.diff(self.offsets)
+
+    def lignes(self):
+        # Position de la ligne d'origine de chaque valeur
+        return np.repeat(np.arange(len(self.index)), self.longueurs())
+
+    def exploser(self):
+        # Équivalent de .explode() : une valeur par ligne, indexée comme la série d'origine
+        return pd.Series(self.valeurs, index=self.index[self.lignes()], dtype=object)
+
+    def listes(self):
+        # Retour au format d'origine (une liste Python par ligne)
+        morceaux = np.split(self.valeurs, self.offsets[1:-1]) if len(self.index) else []
+        return pd.Series([m.tolist() for m in morceaux], index=self.index, dtype=object)
+
+
+def analyser_listes(serie):
+    # Découpe en une passe une série de listes écrites en texte ; les valeurs manquantes sont ignorées
+    serie = serie.dropna()
+    if len(serie) == 0:
+        return ListesAplaties(np.array([], dtype=object), np.zeros(1, dtype=np.int64), serie.index)
+
+    textes = serie.astype(str).str.translate(_SUPPRESSIONS)
+    nb_morceaux = textes.str.count(",").to_numpy() + 1
+
+    # Un seul split sur la concaténation de toutes les lignes
+    morceaux = np.array(",".join(textes.tolist()).split(","), dtype=object)
+    morceaux = pd.Series(morceaux).str.strip().to_numpy(dtype=object)
+    lignes = np.repeat(np.arange(len(textes)), nb_morceaux)
+
+    # On retire les éléments vides (listes vides, virgules en trop)
+    non_vides = morceaux != ""
+    valeurs = morceaux[non_vides]
+    longueurs = np.bincount(lignes[non_vides], minlength=len(textes))
+    offsets = np.zeros(len(textes) + 1, dtype=np.int64)
+    np.cumsum(longueurs, out=offsets[1:])
+    return ListesAplaties(valeurs, offsets, serie.index)
@@ -0,0 +1,149 @@
+# bibliothèques
+import sys
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# Registre des jeux de données partagés par toutes les sessions du processus.
+# Chaque jeu est construit une seule fois puis distribué en lecture seule via des poignées
+# comptées : la mémoire ne dépend donc pas du nombre d'utilisateurs connectés.
+# Chaque entrée porte la version des fichiers sources dont elle est tirée : après un rafraîchissement,
+# le prochain accès construit la nouvelle version, et l'ancienne est retirée dès sa dernière poignée libérée.
+
+_verrou = threading.Lock()
+_constructeurs = {}  # nom -> fonction sans argument qui construit la valeur
+_versions = {}       # nom -> fonction sans argument qui renvoie la version courante des sources
+_entrees = {}        # (nom, version) -> _Entree
+_courantes = {}      # nom -> dernière version construite
+_verrous_construction = {}
+
+
+class _Entree:
+    def __init__(self, cle, valeur):
+        self.cle = cle
+        self.valeur = valeur
+        self.references = 0
+        self.octets = taille_memoire(valeur)
+
+
+class Poignee:
+    # Accès compté à un jeu de données du registre (libéré explicitement, en sortie de `with`
+    # ou quand l'objet est détruit, par exemple à la fin d'une session Streamlit)
+    def __init__(self, nom, entree):
+        self.nom = nom
+        self.version = entree.cle[1]
+        self._entree = entree
+        self._finaliseur = weakref.finalize(self, _decrementer, entree)
+
+    @property
+    def valeur(self):
+        if not self._finaliseur.alive:
+            raise RuntimeError(f"Poignée sur {self.nom!r} déjà libérée")
+        return self._entree.valeur
+
+    def perimee(self):
+        # Vrai si les sources ont changé depuis l'acquisition (la poignée garde l'ancienne valeur)
+        return self.version != _version(self.nom)
+
+    def vue(self, colonnes=None):
+        # Nouveau DataFrame qui partage les tableaux du registre (aucune copie des données) et dont l'appelant
+        # peut ajouter ou remplacer les colonnes. valeur[colonnes] copierait les colonnes à chaque appel et
+        # marquerait le résultat comme une tranche (SettingWithCopyWarning à la première affectation).
+        valeur = self.valeur
+        if not isinstance(valeur, pd.DataFrame):
+            return valeur
+        if colonnes is None:
+            return valeur.copy(deep=False)
+        return pd.DataFrame({colonne: valeur[colonne] for colonne in colonnes}, index=valeur.index, copy=False)
+
+    def liberer(self):
+        self._finaliseur()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.liberer()
+
+
+def _decrementer(entree):
+    with _verrou:
+        entree.references -= 1
+        # Ancienne version : retirée avec sa dernière poignée
+        nom, version = entree.cle
+        if entree.references <= 0 and _entrees.get(entree.cle) is entree and _courantes.get(nom) != version:
+            del _entrees[entree.cle]
+
+
+def taille_memoire(valeur):
+    # Taille approximative en octets (les tableaux mmap comptent pour leur taille sur disque)
+    if isinstance(valeur, pd.DataFrame):
+        return int(valeur.memory_usage(index=True, deep=True).sum())
+    if isinstance(valeur, pd.Series):
+        return int(valeur.memory_usage(index=True, deep=True))
+    if isinstance(valeur, np.ndarray):
+        return int(valeur.nbytes)
+    if isinstance(valeur, dict):
+        return sum(taille_memoire(v) for v in valeur.values())
+    if isinstance(valeur, (list, tuple)):
+        return sum(taille_memoire(v) for v in valeur)
+    return sys.getsizeof(valeur)
+
+
+def enregistrer(nom, constructeur, version=None):
+    # Déclare comment construire un jeu de données (appelé une seule fois par version, au premier accès).
+    # version : fonction sans argument qui renvoie la version des fichiers lus par constructeur
+    with _verrou:
+        _constructeurs[nom] = constructeur
+        _versions[nom] = version
+
+
+def _version(nom):
+    version = _versions[nom]
+    return None if version is None else version()
+
+
+def acquerir(nom):
+    with _verrou:
+        if nom not in _constructeurs:
+            raise KeyError(f"Jeu de données non enregistré : {nom!r}")
+        verrou_nom = _verrous_construction.setdefault(nom, threading.Lock())
+
+    # Construction hors du verrou global pour ne pas bloquer les autres jeux de données
+    with verrou_nom:
+        cle = (nom, _version(nom))
+        entree = _entrees.get(cle)
+        if entree is None:
+            entree = _Entree(cle, _constructeurs[nom]())
+            with _verrou:
+                _entrees[cle] = entree
+                _courantes[nom] = cle[1]
+                # Versions précédentes sans poignée active
+                for ancienne in [c for c, e in _entrees.items() if c[0] == nom and c != cle and e.references <= 0]:
+                    del _entrees[ancienne]
+
+    with _verrou:
+        entree.references += 1
+    return Poignee(nom, entree)
+
+
+def oublier(nom=None):
+    # Retire du registre les jeux sans poignée active (tous si nom est None)
+    with _verrou:
+        for cle in [c for c, e in _entrees.items() if (nom is None or c[0] == nom) and e.references <= 0]:
+            del _entrees[cle]
+
+
+def empreinte_memoire():
+    # Tableau récapitulatif : un jeu de données par ligne, avec ses poignées actives et sa taille
+    with _verrou:
+        lignes = [{"nom": nom, "version": version, "references": e.references, "octets": e.octets}
+                  for (nom, version), e in _entrees.items()]
+    return pd.DataFrame(lignes, columns=["nom", "version", "references", "octets"])
+
+
+def memoire_totale():
+    with _verrou:
+        return sum(e.octets for e in _entrees.values())